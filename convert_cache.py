@@ -0,0 +1,164 @@
+"""
+Content-addressed cache of converted files.
+
+Entries are keyed on a fingerprint of the input files and the converter
+version, so an identical HEIC+MOV pair is only converted once, however many
+times it is synced or whichever album it is synced from. The fingerprint
+covers the size, head and tail of each file rather than all of it, so that
+looking an entry up does not cost a read of the whole movie. Cached outputs
+are handed out as reflinks where the filesystem supports them and as plain
+copies otherwise, never as hard links, since outputs are later written over
+in place. The least recently used entries are evicted once the cache
+outgrows its size limit.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import struct
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CACHE_DIR = os.path.expanduser('~/.cache/motion_photo')
+CACHE_MAX_BYTES = 4 << 30
+
+# bytes read from each end of a file for its fingerprint.
+SAMPLE_SIZE = 64 * 1024
+
+# ioctl to share the extents of one file with another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def fingerprint_files(paths, salt=b''):
+    """
+    Hash of the size and the first and last `SAMPLE_SIZE` bytes of each file
+    of `paths`. Every part is prefixed with its length, so that moving bytes
+    from the end of one file to the start of the next changes the result.
+    """
+    h = hashlib.blake2b(digest_size=16, salt=salt)
+    for p in paths:
+        with open(p, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(SAMPLE_SIZE)
+            f.seek(max(len(head), size - SAMPLE_SIZE))
+            tail = f.read(SAMPLE_SIZE)
+        h.update(struct.pack('>QQ', size, len(head)))
+        h.update(head)
+        h.update(struct.pack('>Q', len(tail)))
+        h.update(tail)
+    return h.hexdigest()
+
+
+def reflink(src, dest):
+    if not fcntl:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported")
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            os.remove(dest)
+            raise
+
+
+def reflink_or_copy(src, dest):
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        reflink(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class ConversionCache(object):
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, version=0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = version
+        # bytes in the cache as of the last scan, plus the entries this
+        # process added since. None until the first scan.
+        self._size = None
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, paths):
+        return fingerprint_files(paths, str(self.version).encode('utf-8'))
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def fetch(self, key, dest):
+        """
+        Materialises the entry for `key` at `dest`, returning False if there
+        is no such entry.
+        """
+        entry = self._path(key)
+        try:
+            # mtime doubles as the last use for eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        reflink_or_copy(entry, dest)
+        return True
+
+    def fetch_or_build(self, key, dest, build):
+        """
+        Materialises the entry for `key` at `dest`, first calling `build(path)`
+        to write it into the cache if it is missing.
+        """
+        if self.fetch(key, dest):
+            return
+
+        # build next to the entry and rename, so concurrent readers never see
+        # a partial file
+        tmp = self._path(".%s.%s" % (key, uuid.uuid4().hex))
+        try:
+            build(tmp)
+            os.replace(tmp, self._path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        reflink_or_copy(self._path(key), dest)
+        self._added(os.stat(self._path(key)).st_size)
+
+    def _added(self, size):
+        """
+        Accounts for a new entry of `size` bytes, scanning the cache for
+        entries to evict only when it may have outgrown its limit. Entries
+        added by other processes are only seen by the next scan.
+        """
+        if self._size is not None and self._size + size <= self.max_bytes:
+            self._size += size
+        else:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries once the cache is over its
+        limit, down to three quarters of it so that the next scan is not
+        due on the next miss.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        target = self.max_bytes if total <= self.max_bytes else self.max_bytes * 3 // 4
+        for (_, size, path) in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
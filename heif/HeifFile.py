@@ -1,48 +1,43 @@
 from isobmff.MediaFile import MediaFile
-from heif.content import Content, XMPChunk
+from heif.content import Content, XMPChunk, XMP_MIME
 from heif.meta import META
 
 
+# the XMP properties that mark a file as a Motion Photo.
+MOTION_PHOTO_PROPERTIES = ('GCamera:MotionPhoto', 'GCamera:MotionPhotoVersion',
+                           'GCamera:MotionPhotoPresentationTimestampUs')
+
+
 class HeifFile(MediaFile):
-    def __enter__(self):
-        super().__enter__()
-        items = []
-        self.content = None
-        self.meta = None
-
-        for item in self.items:
-            if item.type == META.type:
-                self.meta = item.cast_to(META)
-                items.append(self.meta)
-
-            elif item.type == Content.type:
-                self.content = item.cast_to(Content)
-                items.append(self.content)
-            else:
-                items.append(item)
-
-        self.items = items
-        self.content.read(self.meta)
-
-        return self
+    specialised = {META.type: META, Content.type: Content}
+
+    @property
+    def meta(self) -> META:
+        return self.find(META.type)
+
+    @property
+    def content(self) -> Content:
+        content = self.find(Content.type)
+        if content and not content.meta:
+            content.read(self.meta)
+        return content
         
     def describe_for_motion_photo(self):
         print("Describing HEIF file for Motion Photo")
         print("=====================================")
         print("Scanning %d iinf box(es)..."%(self.meta.iinf.count))
         
-        mime_ids = []
+        mime_ids = self.meta.iinf.ids_of_kind('mime')
 
-        for infe in self.meta.iinf:
-            if infe.inf == 'mime':
-                print(infe)
-                mime_ids.append(infe.id)
+        for id in mime_ids:
+            print(self.meta.iinf.find(id))
 
         print("found %d XMP chunk(s). %r"%(len(mime_ids), mime_ids))
         
         print("Scanning %d content chunk(s)..."%(len(self.content.chunks)))
 
-        for chunk in self.content.chunks:
+        for chunk in self.content.chunks_with_mime(XMP_MIME):
             if isinstance(chunk, XMPChunk):
                 print(chunk)
+                print(chunk.properties(*MOTION_PHOTO_PROPERTIES))
                 print(chunk.contents_as_string())
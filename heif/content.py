@@ -2,7 +2,10 @@ from isobmff.BoundedBuffer import BoundedBuffer
 from isobmff.Box import Box
 from heif.meta import INFE, META, ILOCEntry
 from xml.dom import Node
-from xml.dom.minidom import parse, parseString
+from xml.dom.minidom import parseString
+from xml.etree.ElementTree import XMLPullParser
+
+XMP_MIME = 'application/rdf+xml'
 
 class Chunk(object):
     def __init__(self, id: int, index: int, meta: INFE, iloc: ILOCEntry, buffer: BoundedBuffer):
@@ -16,9 +19,95 @@ class Chunk(object):
         return "<Chunk 0x%04x >"%(self.id)
 
 class XMPChunk(Chunk):
+    """
+    An XMP packet. Single properties are looked up with an incremental
+    parser that stops as soon as it has found them, and the results are
+    cached. `contents` builds a full DOM, for callers that need to edit it.
+    """
+
+    # size of the pieces the packet is fed to the parser in.
+    FEED_SIZE = 4096
+
+    def __init__(self, id: int, index: int, meta: INFE, iloc: ILOCEntry, buffer: BoundedBuffer):
+        super().__init__(id, index, meta, iloc, buffer)
+        self._raw = None
+        self._properties = {}
+        self._directory = None
+
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self.buffer.seek(0)
+            # kept past the file, so copied out of it.
+            self._raw = bytes(self.buffer.read(self.buffer.source_size))
+        return self._raw
+
+    def _elements(self):
+        """
+        Yields `(event, element, prefixes)` as the packet is parsed, with
+        `prefixes` mapping the namespace prefixes declared so far to URIs.
+        """
+        parser = XMLPullParser(events=('start-ns', 'start', 'end'))
+        prefixes = {}
+        raw = self.raw()
+        for start in range(0, len(raw), XMPChunk.FEED_SIZE):
+            parser.feed(raw[start:start + XMPChunk.FEED_SIZE])
+            for (event, value) in parser.read_events():
+                if event == 'start-ns':
+                    (prefix, uri) = value
+                    prefixes[prefix] = uri
+                else:
+                    yield (event, value, prefixes)
+        parser.close()
+
+    def _qualify(self, name: str, prefixes: dict) -> str:
+        (prefix, local) = name.split(':', 1)
+        if prefix in prefixes:
+            return '{%s}%s' % (prefixes[prefix], local)
+
+    def properties(self, *names: str) -> dict:
+        """
+        Values of the properties `names`, given as 'prefix:name' with the
+        prefixes used in the packet (e.g. 'GCamera:MotionPhoto'). Properties
+        may be attributes or simple elements. Missing ones map to None.
+        """
+        wanted = set(name for name in names if name not in self._properties)
+        found = {}
+
+        if wanted:
+            for (event, element, prefixes) in self._elements():
+                for name in wanted - set(found):
+                    qualified = self._qualify(name, prefixes)
+                    if event == 'start' and qualified in element.attrib:
+                        found[name] = element.attrib[qualified]
+                    elif event == 'end' and element.tag == qualified:
+                        found[name] = (element.text or '').strip()
+                if len(found) == len(wanted):
+                    break
+
+            for name in wanted:
+                self._properties[name] = found.get(name)
+
+        return dict((name, self._properties[name]) for name in names)
+
+    def directory(self) -> list:
+        """
+        The `Container:Item` entries of a Motion Photo container directory,
+        as dicts of their attributes such as 'Item:Mime' and 'Item:Length'.
+        """
+        if self._directory is None:
+            self._directory = []
+            for (event, element, prefixes) in self._elements():
+                if event == 'start' and element.tag == self._qualify('Container:Item', prefixes):
+                    uris = dict((uri, prefix) for (prefix, uri) in prefixes.items())
+                    item = {}
+                    for (key, value) in element.attrib.items():
+                        (uri, local) = key[1:].split('}', 1) if key.startswith('{') else (None, key)
+                        item['%s:%s' % (uris.get(uri, uri), local) if uri else local] = value
+                    self._directory.append(item)
+        return self._directory
+
     def contents(self):
-        self.buffer.seek(0)
-        parsed = parseString(self.buffer.read(self.buffer.size))
+        parsed = parseString(self.raw())
         self._cleanup_nodes(parsed)
         return parsed
 
@@ -71,7 +160,7 @@ class Content(Box):
             infe = self.meta.iinf.find(item.id)
             if item.content_start >= offs:
                 buffer = BoundedBuffer(file, item.content_start - offs, item.content_size)
-                if infe.inf == 'mime' and infe.mime == 'application/rdf+xml':
+                if infe.inf == 'mime' and infe.mime == XMP_MIME:
                     chunk = XMPChunk(item.id, i, infe, item, buffer)
                 else:
                     chunk = Chunk(item.id, i, infe, item, buffer)
@@ -81,5 +170,22 @@ class Content(Box):
             self._chunks_by_id[item.id] = chunk
             i += 1
 
+    def chunk(self, id: int) -> Chunk:
+        return self._chunks_by_id.get(id)
+
+    def chunk_at(self, offset: int) -> Chunk:
+        """
+        The chunk covering absolute offset `offset` of the file, or None.
+        """
+        item = self.meta.iloc.item_at(offset)
+        if item:
+            return self.chunk(item.id)
+
+    def chunks_with_mime(self, mime: str) -> list:
+        chunks = [self.chunk(id) for id in self.meta.iinf.ids_with_mime(mime)]
+        return sorted([chunk for chunk in chunks if chunk], key=lambda chunk: chunk.index)
+
     def repr_additional_info(self):
+        if not self.meta:
+            return None
         return "%d chunk(s)"%(len(self.chunks))
@@ -1,15 +1,20 @@
+import struct
+from array import array
+from bisect import bisect_right
 from isobmff.Box import FullAtom
 from isobmff.BoundedBuffer import BoundedBuffer
 from isobmff.BoxList import BoxList
+from isobmff.Layout import Layout
 
 
 class INFE(FullAtom):
     type = b"infe"
 
+    LAYOUT = Layout(('id', 'H'), ('reserved', 'H'))
+
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, INFE.type)
-        self.id = self.buffer.read_int16_be()
-        self.reserved = self.buffer.read_int16_be()
+        INFE.LAYOUT.read_into(self, self.buffer)
         self.inf = self.buffer.read_cstring()
 
         if self.inf == "mime":
@@ -30,121 +35,459 @@ class IINF(FullAtom):
 
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, IINF.type)
+
+    def read_payload(self):
+        self.seek_to_content()
         self.count = self.buffer.read_int16_be()
         self._read_entries()
 
     def _read_entries(self):
-        self._entries = [x.cast_to(INFE)
-                         for x in BoxList(self.contents(), 2).cache]
+        self._entries = list(BoxList(self.contents(), 2, {INFE.type: INFE}))
 
         self._by_id = {}
+        self._by_kind = {}
+        self._by_mime = {}
 
         if len(self._entries) != self.count:
             raise Exception("Invalid IINF box")
 
         for entry in self._entries:
             self._by_id[entry.id] = entry
+            self._by_kind.setdefault(entry.inf, []).append(entry.id)
+            if entry.mime is not None:
+                self._by_mime.setdefault(entry.mime, []).append(entry.id)
 
     def __iter__(self):
+        self.load()
         return self._entries.__iter__()
 
+    def ids_of_kind(self, kind: str) -> list:
+        """
+        Ids of the items of type `kind`, in the order they are declared.
+        """
+        self.load()
+        return self._by_kind.get(kind, [])
+
+    def ids_with_mime(self, mime: str) -> list:
+        self.load()
+        return self._by_mime.get(mime, [])
+
     def first_id_of_kind(self, kind: str):
-        for entry in self._entries:
-            if entry.inf == kind:
-                return entry.id
+        ids = self.ids_of_kind(kind)
+        if ids:
+            return ids[0]
 
     def find(self, id: int) -> INFE:
+        self.load()
         return self._by_id[id]
 
 
 class ILOCEntry(object):
-    size = 16
-
-    OFFSET_CONTENT_START = 8
-    OFFSET_CONTENT_SIZE = 12
-
-    def __init__(self, buffer: BoundedBuffer):
-        self.buffer = buffer
-        self.offset = buffer.current_position()
-        self.id = buffer.read_int16_be()
-        self.reserved = buffer.read_int16_be()
-        self.reserved_1 = buffer.read_int32_be()
-        self.content_start = buffer.read_int32_be()
-        self.content_size = buffer.read_int32_be()
+    """
+    An item of the ILOC table. The fields are stored in the table's columns,
+    so that relocating the table moves every entry at once.
+    """
+
+    def __init__(self, iloc, index: int):
+        self.iloc = iloc
+        self.index = index
+        self.offset = iloc._rows[index]
+
+    @property
+    def id(self) -> int:
+        return self.iloc._ids[self.index]
+
+    @property
+    def construction_method(self) -> int:
+        return self.iloc._methods[self.index]
+
+    @property
+    def data_reference_index(self) -> int:
+        return self.iloc._drefs[self.index]
+
+    @property
+    def base_offset(self) -> int:
+        return self.iloc._bases[self.index]
+
+    def extents(self):
+        """
+        `(index, offset, length)` of each extent, with `offset` relative to
+        `base_offset`.
+        """
+        first = self.iloc._first[self.index]
+        last = self.iloc._first[self.index + 1]
+        return list(zip(self.iloc._indices[first:last], self.iloc._offsets[first:last], self.iloc._lengths[first:last]))
+
+    @property
+    def reserved(self) -> int:
+        # the 16-bit field holding the construction method in v1/v2.
+        return self.construction_method
+
+    @property
+    def reserved_1(self) -> int:
+        # data_reference_index and extent_count, as stored in v1/v2 tables
+        # without a base offset.
+        return (self.data_reference_index << 16) | len(self.extents())
+
+    @property
+    def content_start(self) -> int:
+        """
+        Start of the first extent.
+        """
+        return self.base_offset + self.iloc._offsets[self.iloc._first[self.index]]
+
+    @property
+    def content_size(self) -> int:
+        """
+        Length of the first extent.
+        """
+        return self.iloc._lengths[self.iloc._first[self.index]]
 
     def __repr__(self):
-        return "<ILOCEntry id=0x%04x 0x%04x 0x%08x start=0x%08x size=%d>" % (self.id, self.reserved, self.reserved_1, self.content_start, self.content_size)
+        extents = self.extents()
+        if len(extents) == 1:
+            return "<ILOCEntry id=0x%04x 0x%04x 0x%08x start=0x%08x size=%d>" % (self.id, self.reserved, self.reserved_1, self.content_start, self.content_size)
+        return "<ILOCEntry id=0x%04x 0x%04x 0x%08x base=0x%08x extents=%r>" % (self.id, self.reserved, self.reserved_1, self.base_offset, extents)
 
     def set_content_start(self, n: int):
-        self.buffer.seek(self.offset + ILOCEntry.OFFSET_CONTENT_START)
-        self.buffer.write_int32_be(n)
-        self.content_start = n
+        first = self.iloc._first[self.index]
+        self.iloc._set_field(self.index, self.iloc._extent_field(first, 'offset'), self.iloc.offset_size, n - self.base_offset)
+        self.iloc._offsets[first] = n - self.base_offset
+        self.iloc._invalidate()
 
     def set_content_size(self, n: int):
-        self.buffer.seek(self.offset + ILOCEntry.OFFSET_CONTENT_SIZE)
-        self.buffer.write_int32_be(n)
-        self.content_size = n
+        first = self.iloc._first[self.index]
+        self.iloc._set_field(self.index, self.iloc._extent_field(first, 'length'), self.iloc.length_size, n)
+        self.iloc._lengths[first] = n
+        self.iloc._invalidate()
 
 
 class ILOC(FullAtom):
+    """
+    Item locations, versions 0 to 2. The table is decoded into columns:
+    one array per item field, plus the extents of all items in one set of
+    arrays, with `_first[i]` the index of item `i`'s first extent.
+    """
     type = b"iloc"
 
+    # struct formats for the field widths allowed by the spec.
+    FORMATS = {0: '', 4: 'I', 8: 'Q'}
+
+    # the field sizes, and the item count, which is 32-bit from v2 on.
+    LAYOUTS = {
+        0: Layout(('reserved', 'H'), ('count', 'H')),
+        2: Layout(('reserved', 'H'), ('count', 'I')),
+    }
+
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, ILOC.type)
-        self.reserved = self.buffer.read_int16_be()
-        self.count = self.buffer.read_int16_be()
-        self._by_id = {}
-        self.content_offset += 4
+        self.content_offset += ILOC.LAYOUTS[2 if self.version == 2 else 0].size
+
+    def read_payload(self):
+        self.buffer.seek(self.offset + self.header_size + FullAtom.HEADER.size)
+        ILOC.LAYOUTS[2 if self.version == 2 else 0].read_into(self, self.buffer)
+
+        self.offset_size = self.reserved >> 12
+        self.length_size = (self.reserved >> 8) & 0xf
+        self.base_offset_size = (self.reserved >> 4) & 0xf
+        self.index_size = self.reserved & 0xf if self.version > 0 else 0
+
+        if self.version > 2 or any(size not in ILOC.FORMATS for size in
+                                   (self.offset_size, self.length_size, self.base_offset_size, self.index_size)):
+            raise Exception("Invalid ILOC box")
+
         self._read_entries()
 
     def repr_additional_info(self):
         return "%s reserved=%04x count=%d" % (super().repr_additional_info(), self.reserved, self.count)
 
+    def _item_layout(self) -> Layout:
+        fields = [('id', 'H' if self.version < 2 else 'I')]
+        if self.version > 0:
+            fields.append(('method', 'H', lambda n: n & 0xf))
+        fields.append(('dref', 'H'))
+        if self.base_offset_size:
+            fields.append(('base', ILOC.FORMATS[self.base_offset_size]))
+        fields.append(('count', 'H'))
+        return Layout(*fields)
+
+    def _extent_layout(self) -> Layout:
+        return Layout(*[(name, ILOC.FORMATS[size]) for (name, size) in
+                        (('index', self.index_size), ('offset', self.offset_size), ('length', self.length_size))
+                        if size])
+
+    def _extent_field(self, extent: int, field: str) -> int:
+        """
+        Position of a field of an extent relative to the start of its item.
+        """
+        item = self._extent_item[extent]
+        layout = self._extent_layout()
+        if field not in layout.names:
+            raise Exception("ILOC has no room for the extent %s" % field)
+        return self._item_layout().size + (extent - self._first[item]) * layout.size + layout.offset(field)
+
     def _read_entries(self):
-        self._entries = []
         buffer = self.contents()
-        buffer.repeat_relative(lambda: self._read_entry(buffer))
-        if len(self._entries) != self.count:
-            raise Exception("Invalid ILOC box")
-
-    def _read_entry(self, buffer):
-        entry = ILOCEntry(buffer)
-        self._entries.append(entry)
-        self._by_id[entry.id] = entry
+        buffer.seek(0)
+        table = buffer.read(buffer.source_size)
+
+        item = self._item_layout()
+        extent = self._extent_layout()
+
+        self._invalidate()
+        self._ids = array('L')
+        self._methods = array('B')
+        self._drefs = array('H')
+        self._bases = array('Q')
+        self._rows = array('L')
+        self._first = array('L', [0])
+        self._extent_item = array('L')
+        self._indices = array('Q')
+        self._offsets = array('Q')
+        self._lengths = array('Q')
+
+        # every item takes at least its own fields, so a count the box has
+        # no room for is rejected before decoding anything.
+        if self.count * item.size > len(table):
+            raise Exception("Invalid ILOC box: %d items do not fit %d bytes" % (self.count, len(table)))
+
+        # one extent per item is by far the most common layout, and can be
+        # decoded in one call.
+        row = item + extent
+        if len(table) == self.count * row.size and self._read_uniform(table, row):
+            return
+
+        position = 0
+        try:
+            for i in range(self.count):
+                values = dict(zip(item.names, item.unpack(table, position)))
+                self._add_item(position, values)
+                position += item.size
+                for _ in range(values['count']):
+                    self._add_extent(i, dict(zip(extent.names, extent.unpack(table, position))))
+                    position += extent.size
+                self._first.append(len(self._offsets))
+        except struct.error:
+            raise Exception("Invalid ILOC box: table ends within item %d" % i)
+
+        if position != len(table):
+            raise Exception("Invalid ILOC box: %d bytes after the last item" % (len(table) - position))
+
+        self._by_id = dict((id, i) for (i, id) in enumerate(self._ids))
+
+    def _read_uniform(self, table: bytes, row: Layout) -> bool:
+        # if every row read this way has an extent count of 1, then reading
+        # item by item finds the same rows, so the layout can't be mistaken
+        # for one with other counts that happens to have the same size.
+        columns = row.iter_unpack(table)
+        if any(count != 1 for count in columns['count']):
+            return False
+
+        zeros = [0] * self.count
+        self._ids.extend(columns['id'])
+        self._methods.extend(method & 0xf for method in columns.get('method', zeros))
+        self._drefs.extend(columns['dref'])
+        self._bases.extend(columns.get('base', zeros))
+        self._rows.extend(range(0, len(table), row.size))
+        self._first.extend(range(1, self.count + 1))
+        self._extent_item.extend(range(self.count))
+        self._indices.extend(columns.get('index', zeros))
+        self._offsets.extend(columns.get('offset', zeros))
+        self._lengths.extend(columns.get('length', zeros))
+        self._by_id = dict((id, i) for (i, id) in enumerate(self._ids))
+        return True
+
+    def _add_item(self, position: int, values: dict):
+        self._ids.append(values['id'])
+        self._methods.append(values.get('method', 0))
+        self._drefs.append(values['dref'])
+        self._bases.append(values.get('base', 0))
+        self._rows.append(position)
+
+    def _add_extent(self, i: int, values: dict):
+        self._extent_item.append(i)
+        self._indices.append(values.get('index', 0))
+        self._offsets.append(values.get('offset', 0))
+        self._lengths.append(values.get('length', 0))
+
+    def _set_field(self, index: int, position: int, size: int, n: int):
+        if n < 0 or n >= 1 << (size * 8):
+            raise Exception("Item 0x%04x does not fit a %d-bit ILOC field" % (self._ids[index], size * 8))
+        self.contents().replace(self._rows[index] + position, size, n.to_bytes(size, byteorder='big'))
+
+    def _pack_table(self) -> bytes:
+        item = self._item_layout().struct.format[1:]
+        extent = self._extent_layout().struct.format[1:]
+        formats = []
+        values = []
+
+        for i in range(len(self._ids)):
+            (first, last) = (self._first[i], self._first[i + 1])
+            formats.append(item)
+            values.append(self._ids[i])
+            if self.version > 0:
+                values.append(self._methods[i])
+            values.append(self._drefs[i])
+            if self.base_offset_size:
+                values.append(self._bases[i])
+            values.append(last - first)
+
+            for j in range(first, last):
+                formats.append(extent)
+                if self.index_size:
+                    values.append(self._indices[j])
+                if self.offset_size:
+                    values.append(self._offsets[j])
+                if self.length_size:
+                    values.append(self._lengths[j])
+
+        try:
+            return struct.pack('>' + ''.join(formats), *values)
+        except struct.error:
+            raise Exception("ILOC offsets do not fit the table's field sizes")
+
+    def entries(self):
+        """
+        Entries in the order they are stored in the box.
+        """
+        self.load()
+        return [ILOCEntry(self, i) for i in range(len(self._ids))]
+
+    def _invalidate(self):
+        self._order = None
+        self._extent_starts = None
+
+    def _sorted(self) -> list:
+        """
+        Entries by content start, kept until the table is edited.
+        """
+        self.load()
+        if self._order is None:
+            self._order = sorted(self.entries(), key=lambda x: x.content_start)
+        return self._order
 
     def reversed(self):
-        return sorted(self._entries, key=lambda x: x.content_start, reverse=True)
+        return list(reversed(self._sorted()))
 
     def __iter__(self):
-        return sorted(self._entries, key=lambda x: x.content_start).__iter__()
+        return self._sorted().__iter__()
+
+    def item_at(self, offset: int) -> ILOCEntry:
+        """
+        The item with an extent covering absolute offset `offset` of this
+        file, or None.
+        """
+        self.load()
+        if self._extent_starts is None:
+            # extents stored in this file, by absolute start.
+            extents = sorted((self._bases[i] + o, l, i) for (i, o, l) in
+                             zip(self._extent_item, self._offsets, self._lengths)
+                             if self._methods[i] == 0 and self._drefs[i] == 0)
+            self._extent_starts = [start for (start, _, _) in extents]
+            self._extents = extents
+
+        j = bisect_right(self._extent_starts, offset) - 1
+        if j >= 0:
+            (start, length, i) = self._extents[j]
+            if offset < start + length:
+                return ILOCEntry(self, i)
+
+    def _check_width(self, values: list, size: int):
+        limit = 1 << (size * 8)
+        if any(n < 0 or n >= limit for n in values):
+            raise Exception("ILOC offsets do not fit %d-bit fields after relocation" % (size * 8))
+
+    def relocate(self, at: int, delta: int) -> int:
+        """
+        Moves every item stored in this file at or after absolute offset `at`
+        by `delta` bytes, and writes the table back as a single edit. Items
+        stored elsewhere (in `idat`, by item reference or in another file)
+        are left alone.
+
+        Returns the number of items moved.
+        """
+        self.load()
+        in_file = [m == 0 and d == 0 for (m, d) in zip(self._methods, self._drefs)]
+
+        # an item whose base offset moves takes all of its extents along;
+        # otherwise only the extents behind `at` move.
+        bases = [self.base_offset_size > 0 and f and b >= at for (f, b) in zip(in_file, self._bases)]
+        extents = [in_file[i] and not bases[i] and self._bases[i] + o >= at
+                   for (i, o) in zip(self._extent_item, self._offsets)]
+
+        moved = set(i for (i, b) in enumerate(bases) if b)
+        moved.update(i for (i, e) in zip(self._extent_item, extents) if e)
+        if not moved:
+            return 0
+
+        if not self.offset_size and any(extents):
+            # such extents start at their base offset, or at the start of
+            # the file if there is none, so they can only move with it.
+            raise Exception("ILOC has no room for the extent offset of item 0x%04x" %
+                            self._ids[self._extent_item[extents.index(True)]])
+
+        new_bases = [b + delta if m else b for (b, m) in zip(self._bases, bases)]
+        new_offsets = [o + delta if m else o for (o, m) in zip(self._offsets, extents)]
+        self._check_width(new_bases, self.base_offset_size)
+        self._check_width(new_offsets, self.offset_size)
+
+        self._bases = array('Q', new_bases)
+        self._offsets = array('Q', new_offsets)
+
+        table = self._pack_table()
+        self.contents().replace(0, len(table), table)
+        self._invalidate()
+        return len(moved)
 
     def describe_changes(self):
         self.contents().describe_changes()
         
     def __getitem__(self, id: int) -> ILOCEntry:
-        return self._by_id[id]
+        self.load()
+        return ILOCEntry(self, self._by_id[id])
+
+    def get(self, id: int) -> ILOCEntry:
+        self.load()
+        if id in self._by_id:
+            return ILOCEntry(self, self._by_id[id])
 
 class META(FullAtom):
     type = b'meta'
 
+    specialised = {IINF.type: IINF, ILOC.type: ILOC}
+
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, META.type)
-        self._read_entries()
 
-    def _read_entries(self):
-        self._entries = []
-        self.iinf = None
-        self.iloc = None
-
-        for box in BoxList(self.contents(), 0):
-            if (box.type == b'iinf'):
-                self.iinf = box.cast_to(IINF)
-                self._entries.append(self.iinf)
-            elif (box.type == b'iloc'):
-                self.iloc = box.cast_to(ILOC)
-                self._entries.append(self.iloc)
-            else:
-                self._entries.append(box)
+    def read_payload(self):
+        self._entries = BoxList(self.contents(), 0, META.specialised)
+
+    def _contents_resized(self, contents: BoundedBuffer, delta: int):
+        growth = self._header_growth
+        super()._contents_resized(contents, delta)
+        delta += self._header_growth - growth
+
+        # everything stored behind this box has moved by `delta`. meta is a
+        # top-level box, so positions in its buffer are file offsets.
+        end = self.buffer.position_of(contents) + contents.size - delta
+        iloc = self.iloc
+        if iloc:
+            iloc.relocate(end, delta)
+
+    def find_child(self, type: bytes):
+        self.load()
+        return self._entries.find(type)
+
+    @property
+    def iinf(self) -> IINF:
+        self.load()
+        return self._entries.find(IINF.type)
+
+    @property
+    def iloc(self) -> ILOC:
+        self.load()
+        return self._entries.find(ILOC.type)
 
     def __iter__(self):
+        self.load()
         return self._entries.__iter__()
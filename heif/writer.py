@@ -0,0 +1,268 @@
+import os
+import struct
+from heif.HeifFile import HeifFile
+from heif.content import Content, XMP_MIME
+from heif.meta import IINF, ILOC, META
+from isobmff.Box import Box
+from isobmff.copy import copy_range
+
+
+def box_header(type: bytes, payload_size: int) -> bytes:
+    if payload_size + 8 > 0xffffffff:
+        return struct.pack('>I4sQ', 1, type, payload_size + 16)
+    return struct.pack('>I4s', payload_size + 8, type)
+
+
+def box(type: bytes, payload: bytes) -> bytes:
+    return box_header(type, len(payload)) + payload
+
+
+def full_atom(type: bytes, version: int, flags: int, payload: bytes) -> bytes:
+    return box(type, struct.pack('>I', (version << 24) | flags) + payload)
+
+
+class HeifWriter(object):
+    """
+    Rewrites a HEIF file with its XMP item added or replaced, and optionally
+    whole files appended as extra top-level boxes.
+
+    The output is planned up front as a list of segments, either `bytes` to
+    emit or `(path, offset, length)` ranges of a source file, so that it can
+    be written in one sequential pass: `meta` is rebuilt with the new `infe`
+    and `iloc` entries, every other box is copied as-is, and the XMP packet is
+    appended to the end of `mdat`. All `iloc` offsets are relocated to match.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.xmp = None
+        self.appended = []
+
+    def set_xmp(self, xmp: bytes):
+        self.xmp = xmp
+
+    def append_box(self, type: bytes, path: str):
+        """
+        Wraps the file at `path` in a box of `type` behind the existing boxes.
+        """
+        self.appended.append((type, path))
+
+    def write(self, dest: str):
+        sources = [self.path] + [path for (_, path) in self.appended]
+        if os.path.exists(dest) and any(os.path.samefile(path, dest) for path in sources):
+            raise Exception("Cannot rewrite %s in place" % dest)
+
+        with HeifFile(self.path, use_mmap=True) as heif:
+            segments = self.plan(heif)
+
+        # written aside and renamed, so that a failed write never leaves a
+        # truncated file at `dest` that looks newer than its sources.
+        tmp = dest + '.tmp'
+        files = {}
+        try:
+            with open(tmp, 'wb', buffering=0) as out:
+                for segment in segments:
+                    if type(segment) == tuple:
+                        (path, offset, length) = segment
+                        if path not in files:
+                            files[path] = open(path, 'rb')
+                        copy_range(files[path], out, offset, length)
+                    else:
+                        out.write(segment)
+            os.replace(tmp, dest)
+        finally:
+            for f in files.values():
+                f.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def plan(self, heif: HeifFile) -> list:
+        meta = heif.meta
+        mdat = heif.find(Content.type)
+
+        if not meta or not mdat:
+            raise Exception("%s has no meta or mdat box" % self.path)
+
+        if self.xmp is None:
+            return [(self.path, box.offset, box.size) for box in heif.items] + self._plan_appended()
+
+        iinf = meta.iinf
+        iloc = meta.iloc
+
+        # entries are rebuilt as v1 rows with 32-bit offsets and a single
+        # extent.
+        if iloc.version != 1 or iloc.reserved != 0x4400 or \
+                any(len(entry.extents()) != 1 for entry in iloc.entries()):
+            raise Exception("Unsupported ILOC layout v%d %04x" % (iloc.version, iloc.reserved))
+
+        payload_start = mdat.offset + mdat.header_size
+        payload_end = mdat.next_offset()
+
+        # the existing XMP item, if any, keeps its id and infe. Its old
+        # payload is dropped from mdat.
+        removed = None
+        xmp_id = None
+        xmp_ids = iinf.ids_with_mime(XMP_MIME)
+        if xmp_ids:
+            xmp_id = xmp_ids[0]
+            # an infe without an iloc entry has nothing to drop; the entry
+            # is added like a new item's.
+            old = iloc.get(xmp_id)
+            if old and old.reserved & 0xf == 0 and payload_start <= old.content_start \
+                    and old.content_start + old.content_size <= payload_end:
+                removed = (old.content_start, old.content_start + old.content_size)
+
+        added = xmp_id is None
+        if added:
+            xmp_id = max([infe.id for infe in iinf] + [entry.id for entry in iloc.entries()]) + 1
+            if xmp_id > 0xffff:
+                raise Exception("No free item id for XMP")
+
+        mdat_payload = payload_end - payload_start + len(self.xmp)
+        if removed:
+            mdat_payload -= removed[1] - removed[0]
+        mdat_header = box_header(Content.type, mdat_payload)
+
+        # offsets have fixed width, so the size of the rebuilt meta box does
+        # not depend on them.
+        meta_size = len(self._build_meta(meta, xmp_id, added, {}, 0))
+
+        # (start, end, new length) in source coordinates
+        edits = [
+            (meta.offset, meta.next_offset(), meta_size),
+            (mdat.offset, payload_start, len(mdat_header)),
+        ]
+        if removed:
+            edits.append((removed[0], removed[1], 0))
+
+        xmp_start = self._relocate(edits, payload_end)
+        edits.append((payload_end, payload_end, len(self.xmp)))
+
+        offsets = {}
+        for entry in iloc.entries():
+            if entry.id != xmp_id and entry.reserved & 0xf == 0:
+                offsets[entry.id] = self._relocate(edits, entry.content_start)
+
+        new_meta = self._build_meta(meta, xmp_id, added, offsets, xmp_start)
+
+        segments = []
+        for item in heif.items:
+            if item.offset == meta.offset:
+                segments.append(new_meta)
+            elif item.offset == mdat.offset:
+                segments.append(mdat_header)
+                if removed:
+                    segments.append((self.path, payload_start, removed[0] - payload_start))
+                    segments.append((self.path, removed[1], payload_end - removed[1]))
+                else:
+                    segments.append((self.path, payload_start, payload_end - payload_start))
+                segments.append(self.xmp)
+            else:
+                segments.append((self.path, item.offset, item.size))
+
+        segments += self._plan_appended()
+        return [s for s in segments if type(s) != tuple or s[2] > 0]
+
+    def _plan_appended(self) -> list:
+        segments = []
+        for (type, path) in self.appended:
+            size = os.stat(path).st_size
+            segments.append(box_header(type, size))
+            segments.append((path, 0, size))
+        return segments
+
+    def _relocate(self, edits: list, offset: int) -> int:
+        # edits are in source coordinates, so they are all compared against
+        # the source offset before any of them is applied.
+        delta = 0
+        for (start, end, size) in edits:
+            if end <= offset:
+                delta += size - (end - start)
+        return offset + delta
+
+    def _build_meta(self, meta: META, xmp_id: int, added: bool, offsets: dict, xmp_start: int) -> bytes:
+        children = []
+        has_iref = False
+
+        for child in meta:
+            if child.type == ILOC.type:
+                children.append(self._build_iloc(child, xmp_id, offsets, xmp_start))
+            elif child.type == IINF.type and added:
+                children.append(self._build_iinf(child, xmp_id))
+            elif child.type == b'iref' and added:
+                has_iref = True
+                children.append(self._build_iref(meta, child, xmp_id))
+            else:
+                children.append(child.read_raw())
+
+        if added and not has_iref:
+            iref = self._build_iref(meta, None, xmp_id)
+            if iref:
+                children.append(iref)
+
+        return full_atom(META.type, meta.version, meta.flags, b''.join(children))
+
+    def _build_iloc(self, iloc: ILOC, xmp_id: int, offsets: dict, xmp_start: int) -> bytes:
+        entries = []
+        for entry in iloc.entries():
+            if entry.id == xmp_id:
+                continue
+            entries.append(self._pack_iloc_entry(
+                entry.id, entry.reserved, entry.reserved_1,
+                offsets.get(entry.id, entry.content_start), entry.content_size))
+
+        # a single extent, stored in this file
+        entries.append(self._pack_iloc_entry(xmp_id, 0, 1, xmp_start, len(self.xmp)))
+
+        header = struct.pack('>HH', iloc.reserved, len(entries))
+        return full_atom(ILOC.type, iloc.version, iloc.flags, header + b''.join(entries))
+
+    def _pack_iloc_entry(self, id: int, reserved: int, reserved_1: int, start: int, size: int) -> bytes:
+        if start > 0xffffffff or size > 0xffffffff:
+            raise Exception("Item 0x%04x does not fit a 32-bit ILOC entry" % id)
+        return struct.pack('>HHIII', id, reserved, reserved_1, start, size)
+
+    def _build_iinf(self, iinf: IINF, xmp_id: int) -> bytes:
+        entries = [infe.read_raw() for infe in iinf]
+        entries.append(full_atom(b'infe', 2, 0, struct.pack('>HH', xmp_id, 0) +
+                                 b'mime\0' + XMP_MIME.encode('utf-8') + b'\0'))
+
+        count = struct.pack('>H' if iinf.version == 0 else '>I', len(entries))
+        return full_atom(IINF.type, iinf.version, iinf.flags, count + b''.join(entries))
+
+    def _build_iref(self, meta: META, iref: Box, xmp_id: int) -> bytes:
+        """
+        Adds a `cdsc` reference from the XMP item to the primary item, which
+        is how HEIF associates metadata items with an image.
+        """
+        pitm = meta.find_child(b'pitm')
+        if not pitm:
+            return iref.read_raw() if iref else None
+
+        raw = pitm.read_raw()[pitm.header_size:]
+        primary = int.from_bytes(raw[4:6] if raw[0] == 0 else raw[4:8], byteorder='big')
+
+        if iref:
+            raw = iref.read_raw()[iref.header_size:]
+            version = raw[0]
+            flags = int.from_bytes(raw[1:4], byteorder='big')
+            references = bytes(raw[4:])
+        else:
+            version = 0
+            flags = 0
+            references = b''
+
+        if version == 0:
+            if primary > 0xffff:
+                return iref.read_raw() if iref else None
+            cdsc = box(b'cdsc', struct.pack('>HHH', xmp_id, 1, primary))
+        else:
+            cdsc = box(b'cdsc', struct.pack('>IHI', xmp_id, 1, primary))
+
+        return full_atom(b'iref', version, flags, references + cdsc)
+
+
+def inject_xmp(path: str, dest: str, xmp: bytes):
+    writer = HeifWriter(path)
+    writer.set_xmp(xmp)
+    writer.write(dest)
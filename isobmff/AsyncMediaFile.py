@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+from isobmff.Box import Box, InvalidSize
+from isobmff.MediaFile import MediaFile
+from isobmff.SparseSource import SparseSource
+
+
+class AsyncMediaFile(object):
+    """
+    Reads a media file with awaitable I/O, so that one event loop can keep
+    many files in flight, and parses it with the same box classes as
+    `media` (a MediaFile subclass such as HeifFile or QuickTimeFile).
+
+    Top-level boxes are fetched whole as they are iterated, except for the
+    ones in `skip` of which only the header is read, and are then parsed
+    from memory. Once iterated, `self.media` gives the usual synchronous
+    view of the boxes fetched so far:
+
+        async with AsyncMediaFile(path, QuickTimeFile) as f:
+            moov = await f.find(b'moov')
+    """
+    HEADER_SIZE = Box.LARGE_HEADER.size
+
+    def __init__(self, path: str, media=MediaFile, skip=MediaFile.STREAM_SKIP):
+        self.path = path
+        self.media_class = media
+        self.skip = skip
+        self.media = None
+        self.size = 0
+        self._fp = None
+        self._lock = threading.Lock()
+        self._ptr = 0
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self._fp = await loop.run_in_executor(None, open, self.path, 'rb')
+        self.size = os.fstat(self._fp.fileno()).st_size
+
+        self._source = SparseSource()
+        self._source.size = self.size
+        self._next_offset = 0
+        self.media = self.media_class(None, source=self._source).__enter__()
+        self._items = iter(self.media.items)
+        return self
+
+    async def __aexit__(self, _1, _2, _3):
+        self.media.__exit__(_1, _2, _3)
+        self._fp.close()
+        self._fp = None
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        if hasattr(os, 'pread'):
+            return os.pread(self._fp.fileno(), size, offset)
+        with self._lock:
+            self._fp.seek(offset)
+            return self._fp.read(size)
+
+    async def read_at(self, offset: int, size: int) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read_at, offset, size)
+
+    async def seek(self, offset: int):
+        self._ptr = offset
+
+    async def read(self, size: int) -> bytes:
+        data = await self.read_at(self._ptr, size)
+        self._ptr += len(data)
+        return data
+
+    async def _fetch_next(self) -> bool:
+        """
+        Reads the next top-level box into memory, or only its header if it
+        is skipped. Returns False at the end of the file.
+        """
+        offset = self._next_offset
+        if offset >= self.size:
+            return False
+
+        header = await self.read_at(offset, AsyncMediaFile.HEADER_SIZE)
+        if len(header) < Box.HEADER.size:
+            return False
+
+        (size, type) = Box.HEADER.unpack(header)
+        header_size = Box.HEADER.size
+        if size == 1:
+            size = Box.LARGE_HEADER.unpack(header)[2]
+            header_size = Box.LARGE_HEADER.size
+        elif size == 0:
+            size = self.size - offset
+
+        if size < header_size:
+            raise InvalidSize(type, offset, size)
+
+        if type in self.skip:
+            self._source.add(offset, header[:header_size])
+        else:
+            self._source.add(offset, await self.read_at(offset, size))
+
+        self._next_offset = offset + size
+        return True
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for box in self.media.items.cache:
+            yield box
+        while await self._fetch_next():
+            box = next(self._items, None)
+            if box is None:
+                return
+            yield box
+
+    async def find(self, type: bytes) -> Box:
+        async for box in self:
+            if box.type == type:
+                return box
+
+    async def load(self) -> MediaFile:
+        """
+        Fetches every top-level box, and returns the synchronous view.
+        """
+        async for _ in self:
+            pass
+        return self.media
@@ -0,0 +1,70 @@
+import mmap
+from collections import OrderedDict
+
+
+class BlockCache(object):
+    """
+    Read-ahead cache in front of a seekable file object, shared by every
+    buffer of a MediaFile that is not memory mapped.
+
+    Small reads are served from page-aligned blocks of `block_size` bytes,
+    the `blocks` most recently used of which are kept, so parsing the fields
+    of nested headers costs one `seek` + `read` per block rather than per
+    field. Reads larger than a block go straight to the file and are not
+    cached.
+    """
+    BLOCK_SIZE = 64 * 1024
+    BLOCKS = 32
+
+    def __init__(self, source, block_size: int = BLOCK_SIZE, blocks: int = BLOCKS):
+        if block_size <= 0 or block_size % mmap.PAGESIZE:
+            raise ValueError("block size must be a multiple of %d" % mmap.PAGESIZE)
+        self.source = source
+        self.block_size = block_size
+        self.blocks = blocks
+        self._cache = OrderedDict()
+        self._ptr = 0
+
+    def seek(self, offset: int):
+        self._ptr = offset
+
+    def tell(self) -> int:
+        return self._ptr
+
+    def fileno(self) -> int:
+        return self.source.fileno()
+
+    def close(self):
+        self._cache.clear()
+        self.source.close()
+
+    def _block(self, index: int) -> bytes:
+        block = self._cache.get(index)
+        if block is not None:
+            self._cache.move_to_end(index)
+            return block
+
+        self.source.seek(index * self.block_size)
+        block = self.source.read(self.block_size)
+        self._cache[index] = block
+        if len(self._cache) > self.blocks:
+            self._cache.popitem(last=False)
+        return block
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.block_size:
+            self.source.seek(self._ptr)
+            data = self.source.read(size)
+            self._ptr += len(data)
+            return data
+
+        chunks = []
+        while size > 0:
+            (index, start) = divmod(self._ptr, self.block_size)
+            chunk = self._block(index)[start:start + size]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self._ptr += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
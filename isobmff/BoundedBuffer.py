@@ -1,4 +1,6 @@
 from typing import Callable, Tuple, Union
+from weakref import WeakValueDictionary
+from .SpanTree import SpanTree
 
 
 class BufferShort(Exception):
@@ -10,28 +12,33 @@ class UnownedBuffer(Exception):
 
 
 class BoundedBuffer(object):
-    BUFFER_SIZE = 10000
+    # first chunk fetched by read_cstring, doubled for longer strings.
+    CSTRING_CHUNK = 64
 
     def __init__(self, parent, offset: int, size: int, readonly=True):
         self.parent = parent
         self.offset = offset
         self.size = size
+        # reads are addressed in source coordinates, whatever the edits, so
+        # they are bounded by the size before any edit.
+        self.source_size = size
         self.end = offset + size
         self._ptr = 0
         self.readonly = readonly
         self.__memo_cached_abs_offset = None
         self.__memo_cached_word_size = None
-        self._span = []
-        i = 0
-        n = size
-        while n > 0:
-            chunk = min(BoundedBuffer.BUFFER_SIZE, n)
-            n -= chunk
-            self._span.append((i, chunk))
-            i += chunk
+        self._view = None
+        # every view handed out over the root's `_view`, shared with all
+        # children, so that the ones still alive can be released with it.
+        self._views = None
+        self._spans = SpanTree(self, size)
+        self._resize_listeners = []
 
         if isinstance(self.parent, BoundedBuffer):
             self.parent._attach_child(self)
+            if self.parent._view is not None:
+                self._views = self.parent._views
+                self._view = self.parent._export(offset, offset + size)
 
     def __compute_word_size(self):
         if isinstance(self.parent, BoundedBuffer):
@@ -54,7 +61,8 @@ class BoundedBuffer(object):
         pass
 
     def seek(self, offset: int):
-        self.parent.seek(self.offset + offset)
+        if self._view is None:
+            self.parent.seek(self.offset + offset)
         self._ptr = offset
 
     def contains(self, ptr: int) -> bool:
@@ -71,9 +79,18 @@ class BoundedBuffer(object):
         while self._ptr < self.size:
             f()
 
-    def read(self, bytes: int) -> bytes:
-        if not self.contains_next(self._ptr + bytes):
+    def read(self, bytes: int) -> Union[bytes, memoryview]:
+        """
+        Reads `bytes` bytes from the current position. Files mapped or held
+        in memory return a view rather than a copy, which is only valid
+        until the file is closed.
+        """
+        if self._ptr < 0 or self._ptr + bytes > self.source_size:
             raise BufferShort
+        if self._view is not None:
+            start = self._ptr
+            self._ptr += bytes
+            return self._export(start, self._ptr)
         self._ptr += bytes
         return self.parent.read(bytes)
 
@@ -81,17 +98,24 @@ class BoundedBuffer(object):
         return self._ptr
 
     def read_cstring(self) -> str:
-        if self._ptr == self.size:
-            return ""
-
-        self.bytes = b''
-        c = self.read(1)
-        last_pos = self.size - 1
-        while len(c) and c != b'\0' and self._ptr <= last_pos:
-            self.bytes += c
-            c = self.read(1)
-
-        return self.bytes.decode('utf-8')
+        """
+        Reads a NUL-terminated string, or up to the end of the buffer if
+        there is no NUL, in chunks rather than byte by byte.
+        """
+        start = self._ptr
+        chunks = []
+        chunk_size = BoundedBuffer.CSTRING_CHUNK
+        while self._ptr < self.source_size:
+            chunk = bytes(self.read(min(chunk_size, self.source_size - self._ptr)))
+            end = chunk.find(b'\0')
+            if end >= 0:
+                chunks.append(chunk[:end])
+                self.seek(self._ptr - len(chunk) + end + 1)
+                break
+            chunks.append(chunk)
+            chunk_size *= 2
+
+        return b''.join(chunks).decode('utf-8')
 
     def read_int_be(self, size: int = 1):
         return int.from_bytes(self.read(size), byteorder='big')
@@ -161,75 +185,120 @@ class BoundedBuffer(object):
             return span.size
         return len(span)
 
-    def _idx(self, offs: int) -> Tuple[int, int, int, Union[Tuple[int, int], bytes]]:
-        i = 0
-        start = 0
-        for span in self._span:
-            chunk = self._size(span)
-            if start + chunk > offs:
-                return (i, start, chunk, span)
-            start += chunk
-            i += 1
-
-    def _slice_leading(self, offs: int, i: int, start: int, span: Union[Tuple[int, int], bytes]):
-        if type(span) == tuple:
-            self._span[i] = (start, offs - start)
-        elif isinstance(span, BoundedBuffer):
-            raise UnownedBuffer("Content is not owned by this buffer!")
-        else:
-            self._span[i] = span[:offs - start]
-
-    def _slice_trailing(self, offs: int, i: int, start: int, size: int, span: Union[Tuple[int, int], bytes]):
+    def _cut(self, span: Union[Tuple[int, int], bytes], at: int):
         if type(span) == tuple:
-            self._span[i] = (offs - start, size - (offs - start))
+            return ((span[0], at), (span[0] + at, span[1] - at))
         elif isinstance(span, BoundedBuffer):
             raise UnownedBuffer("Content is not owned by this buffer!")
-        else:
-            self._span[i] = span[offs - start:]
-
-    def _write(self, offs: int, size: int, content):
-        start = self._idx(offs)
-        end = self._idx(offs + size)
-
-        before = self._span[:start[0] + 1]
-        before.append(content)
+        return (span[:at], span[at:])
 
-        if end:
-            after = self._span[end[0]:]
-            before += after
-
-        self._span = before
-        self._slice_leading(offs, start[0], start[1], start[3])
-        if end:
-            self._slice_trailing(
-                offs + size, start[0] + 2, end[1], end[2], after[0])
-
-        span = self._span
-        self._span = []
-
-        for i in span:
-            if self._size(i) > 0:
-                self._span.append(i)
-            else:
-                print(">> filter off zero-sized slice")
+    def _write(self, offs: int, size: int, content, key: int = None):
+        self._spans.replace(offs, size, content, key)
 
     def write(self, size: int, content: bytes):
-        self._write(self._ptr, size, content)
-        self._ptr += size
+        delta = self.replace(self._ptr, size, content)
+        self._ptr += len(content)
+        return delta
 
+    def replace(self, offs: int, size: int, content: bytes) -> int:
+        """
+        Replaces `size` bytes at current position `offs` with `content`,
+        resizing this buffer and its parents to match.
+        """
+        self._write(offs, size, content)
         delta = len(content) - size
-        self.size += delta
+        self._resize(delta)
         return delta
 
+    def _resize(self, delta: int):
+        if not delta:
+            return
+        self.size += delta
+        if isinstance(self.parent, BoundedBuffer):
+            self.parent._child_resized(self, delta)
+        for listener in self._resize_listeners:
+            listener(self, delta)
+
+    def _child_resized(self, child, delta: int):
+        self._spans.refresh(child)
+        self._resize(delta)
+
+    def on_resize(self, listener: Callable[['BoundedBuffer', int], None]):
+        """
+        Calls `listener(buffer, delta)` whenever an edit changes the size of
+        this buffer.
+        """
+        self._resize_listeners.append(listener)
+
+    def position_of(self, child) -> int:
+        """
+        Current position of a child buffer, after all edits before it.
+        """
+        return self._spans.position(child)
+
+    def segments(self):
+        """
+        The content of this buffer with all edits applied, as a sequence of
+        `(offset, length)` ranges of the root's source and `bytes` to emit
+        in between. Adjacent ranges and byte strings are merged.
+        """
+        pending = None
+        for segment in self._segments():
+            if pending is None:
+                pending = segment
+            elif type(segment) == tuple and type(pending) == tuple and sum(pending) == segment[0]:
+                pending = (pending[0], pending[1] + segment[1])
+            elif type(segment) == bytes and type(pending) == list:
+                pending.append(segment)
+            else:
+                yield b''.join(pending) if type(pending) == list else pending
+                pending = segment
+
+            if type(pending) == bytes:
+                pending = [pending]
+
+        if pending is not None:
+            yield b''.join(pending) if type(pending) == list else pending
+
+    def _segments(self):
+        for span in self._spans:
+            if type(span) == tuple:
+                yield (self.offs(span[0]), span[1])
+            elif isinstance(span, BoundedBuffer):
+                yield from span._segments()
+            elif len(span):
+                yield bytes(span)
+
+    def _set_view(self, view: memoryview):
+        self._view = view
+        self._views = WeakValueDictionary()
+
+    def _export(self, start: int, end: int) -> memoryview:
+        view = self._view[start:end]
+        self._views[id(view)] = view
+        return view
+
+    def _release_view(self):
+        """
+        Releases the view of the source and every view exported from it,
+        including those of children since replaced by edits.
+        """
+        for view in list(self._views.values()):
+            view.release()
+        self._views.clear()
+        self._view.release()
+        self._view = None
+
     def _attach_child(self, child):
-        self._write(child.offset, child.size, child)
+        self._write(self._spans.translate(child.offset),
+                    child.size, child, child.offset)
 
     def _print(self, indent, contents):
         print("%s%s" % (' '*indent, contents))
 
     def describe_changes(self, indent=0):
-        self._print(indent, "%d span(s):" % (len(self._span)))
-        for i in self._span:
+        self._print(indent, "%d span(s):" % (len(self._spans)))
+        for i in self._spans:
             if type(i) == tuple:
                 self._print(indent, "  - len=%8d  underlying buffer from 0x%08x to 0x%08x" %
                             (i[1], self.offs(i[0]), self.offs(i[0] + i[1])))
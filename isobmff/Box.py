@@ -1,5 +1,6 @@
 from typing import Union
 from isobmff.BoundedBuffer import BoundedBuffer
+from isobmff.Layout import Layout, uint
 
 
 class InvalidType(Exception):
@@ -7,8 +8,21 @@ class InvalidType(Exception):
         super().__init__("Expected %s, received %r" % (type, received))
 
 
+class InvalidSize(ValueError):
+    def __init__(self, type, offset, size):
+        super().__init__("%r box at %d has size %d, smaller than its header" % (type, offset, size))
+
+
+class PayloadError(Exception):
+    pass
+
+
 class Box(object):
+    HEADER = Layout(('size', 'I'), ('type', '4s'))
+    LARGE_HEADER = HEADER + Layout(('large_size', 'Q'))
+
     def __init__(self, buffer: BoundedBuffer, offset: int, type: Union[None, bytes] = None):
+        self._payload_read = False
         self.buffer = buffer
         self.offset = offset
         self.type = type
@@ -17,30 +31,97 @@ class Box(object):
         self.read_header()
         self._contents = None
 
+    def __getattr__(self, name):
+        # Only reached for attributes that are not set yet, i.e. payload
+        # fields of a box that has not been parsed.
+        if name.startswith('_') or self.__dict__.get('_payload_read', True):
+            raise AttributeError(name)
+        try:
+            self.load()
+        except AttributeError as e:
+            # would otherwise be reported as `name` missing, hiding the bug
+            # in the parser.
+            raise PayloadError("Failed to read the payload of %r at %s" %
+                               (self.type, self.buffer.format_addr(self.offset))) from e
+        return getattr(self, name)
+
+    def load(self):
+        if not self._payload_read:
+            self._payload_read = True
+            self.read_payload()
+        return self
+
+    def read_payload(self):
+        pass
+
     def seek_to_header(self):
         self.buffer.seek(self.offset)
 
+    def seek_to_content(self):
+        self.buffer.seek(self.offset + self.content_offset)
+
     def read_header(self):
-        self.size = self.buffer.read_int32_be()
-        type = self.buffer.read(4)
+        (self.size, type) = Box.HEADER.read(self.buffer)
 
         if self.type and self.type != type:
             raise InvalidType(self.type, type)
 
+        self.to_end = self.size == 0
+
         if self.size == 1:
             self.size = self.buffer.read_int64_be()
             self.content_offset += 8
 
-        elif self.size == 0:
-            self.size = self.buffer.size - self.offset
+        elif self.to_end:
+            self.size = self.buffer.source_size - self.offset
 
+        # a box must at least hold its header, or the next one would be read
+        # from within it, or (for a size of 0 in a 64-bit header) in place.
+        if self.size < self.content_offset:
+            raise InvalidSize(type, self.offset, self.size)
+
+        self.header_size = self.content_offset
+        self._header_growth = 0
         self.type = type
 
+    def read_raw(self) -> bytes:
+        self.seek_to_header()
+        return self.buffer.read(self.size)
+
     def contents(self):
         if not self._contents:
             self._contents = BoundedBuffer(self.buffer, self.offset + self.content_offset, self.size - self.content_offset)
+            self._contents.on_resize(self._contents_resized)
         return self._contents
 
+    def edited_size(self) -> int:
+        """
+        Size of the box with the edits made to its contents.
+        """
+        if not self._contents:
+            return self.size
+        return self._header_growth + self.content_offset + self._contents.size
+
+    def _contents_resized(self, contents: BoundedBuffer, delta: int):
+        # `offset`, `size` and `content_offset` stay as parsed, since they
+        # are what locates this box (and the ones after it) in the source.
+        # Only the size field in the edited header changes.
+        if self.to_end:
+            return
+
+        header = self.buffer.position_of(contents) - self.content_offset - self._header_growth
+        size = self.edited_size()
+
+        if self.header_size == 16 or self._header_growth:
+            self.buffer.replace(header + 8, 8, size.to_bytes(8, byteorder='big'))
+
+        elif size <= 0xffffffff:
+            self.buffer.replace(header, 4, size.to_bytes(4, byteorder='big'))
+
+        else:
+            self._header_growth = 8
+            self.buffer.replace(header, 8, Box.LARGE_HEADER.pack(1, self.type, size + 8))
+
     def cast_to(self, specialised, **kwargs):
         return specialised(self.buffer, self.offset, **kwargs)
 
@@ -61,11 +142,12 @@ class Box(object):
         return self.offset + self.size
 
 class FullAtom(Box):
+    HEADER = Layout(('version', 'B'), ('flags', '3s', uint))
+
     def __init__(self, buffer: BoundedBuffer, offset: int, type: Union[None, bytes] = None):
         super().__init__(buffer, offset, type)
-        self.version = self.buffer.read_int8()
-        self.flags = self.buffer.read_int_be(3)
-        self.content_offset += 4
+        FullAtom.HEADER.read_into(self, self.buffer)
+        self.content_offset += FullAtom.HEADER.size
 
     def repr_additional_info(self):
         return "v%d flags=%06x"%(self.version, self.flags)
\ No newline at end of file
@@ -3,21 +3,37 @@ from isobmff.Box import Box
 
 
 class BoxList(object):
-    def __init__(self, buffer: BoundedBuffer, offset: int):
+    """
+    Sibling boxes starting at `offset`. Headers are only read as the list is
+    iterated or searched, and boxes whose type appears in `specialised` are
+    cast to that class as they are reached.
+    """
+
+    def __init__(self, buffer: BoundedBuffer, offset: int, specialised: dict = None):
         self.cache = []
         self.buffer = buffer
-        self.buffer.seek(offset)
-        self.buffer.repeat(self._append_to_cache)
+        self.specialised = specialised or {}
+        self._next_offset = offset
+
+    def _read_next(self) -> Box:
+        if self._next_offset >= self.buffer.source_size:
+            return None
+
+        box = Box(self.buffer, self._next_offset)
+        if box.type in self.specialised:
+            box = box.cast_to(self.specialised[box.type])
 
-    def _append_to_cache(self):
-        box = Box(self.buffer, self.buffer._ptr)
         self.cache.append(box)
-        return box.next_offset()
+        self._next_offset = box.next_offset()
+        return box
 
     def __iter__(self):
-        return self.cache.__iter__()
+        i = 0
+        while i < len(self.cache) or self._read_next():
+            yield self.cache[i]
+            i += 1
 
     def find(self, type: str) -> Box:
-        for box in self.cache:
+        for box in self:
             if type == box.type:
                 return box
@@ -0,0 +1,67 @@
+import struct
+from typing import Union
+from isobmff.BoundedBuffer import BoundedBuffer
+
+
+def uint(data: bytes) -> int:
+    """
+    Decodes big-endian integers of widths struct has no code for.
+    """
+    return int.from_bytes(data, byteorder='big')
+
+
+class Layout(object):
+    """
+    A fixed sequence of big-endian fields, compiled into one `struct.Struct`
+    so that a header is fetched with a single read and decoded in one call.
+
+    Each field is `(name, format)` or `(name, format, convert)`, with
+    `format` a struct code ('B', 'H', 'I', 'Q', or '<n>s' for raw bytes) and
+    `convert` applied to the decoded value.
+    """
+
+    def __init__(self, *fields):
+        self.fields = [field if len(field) == 3 else (field[0], field[1], None) for field in fields]
+        self.struct = struct.Struct('>' + ''.join(format for (_, format, _) in self.fields))
+        self.size = self.struct.size
+        self.names = [name for (name, _, _) in self.fields]
+        self._converts = any(convert for (_, _, convert) in self.fields)
+
+    def __add__(self, other: 'Layout') -> 'Layout':
+        return Layout(*(self.fields + other.fields))
+
+    def offset(self, name: str) -> int:
+        """
+        Position of the field `name` from the start of the layout.
+        """
+        i = self.names.index(name)
+        return struct.calcsize('>' + ''.join(format for (_, format, _) in self.fields[:i]))
+
+    def unpack(self, data: Union[bytes, memoryview], offset: int = 0) -> tuple:
+        values = self.struct.unpack_from(data, offset)
+        if not self._converts:
+            return values
+        return tuple(convert(value) if convert else value
+                     for ((_, _, convert), value) in zip(self.fields, values))
+
+    def iter_unpack(self, data: bytes):
+        """
+        Decodes a table of rows of this layout into one tuple per column.
+        Converters are not applied.
+        """
+        columns = list(zip(*self.struct.iter_unpack(data))) or [()] * len(self.fields)
+        return dict(zip(self.names, columns))
+
+    def read(self, buffer: BoundedBuffer) -> tuple:
+        return self.unpack(buffer.read(self.size))
+
+    def read_into(self, target, buffer: BoundedBuffer):
+        """
+        Reads the fields from the current position of `buffer` and sets them
+        as attributes of `target`.
+        """
+        for (name, value) in zip(self.names, self.read(buffer)):
+            setattr(target, name, value)
+
+    def pack(self, *values) -> bytes:
+        return self.struct.pack(*values)
@@ -1,22 +1,114 @@
+import mmap
 import os
+from typing import Union
+from isobmff.BlockCache import BlockCache
 from isobmff.BoundedBuffer import BoundedBuffer
 from isobmff.Box import Box
 from isobmff.BoxList import BoxList
+from isobmff.SparseSource import SparseSource
+from isobmff.copy import copy_range
 
 
 class MediaFile(BoundedBuffer):
-    def __init__(self, path: str, readonly=True):
+    specialised = {}
+
+    # top-level boxes not kept in memory when reading from a stream.
+    STREAM_SKIP = (b'mdat', b'mpvd', b'free', b'skip', b'wide')
+
+    def __init__(self, path: str, readonly=True, use_mmap=False,
+                 block_size=BlockCache.BLOCK_SIZE, cache_blocks=BlockCache.BLOCKS,
+                 source=None):
         self.path = path
-        super().__init__(None, 0, os.stat(path).st_size, readonly)
+        self.source = source
+        self.use_mmap = use_mmap
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self._mmap = None
+
+        if source is None:
+            size = os.stat(path).st_size
+        elif isinstance(source, SparseSource):
+            size = source.size
+        else:
+            size = memoryview(source).nbytes
+        super().__init__(None, 0, size, readonly)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview], **kwargs):
+        """
+        Parses a file held in memory, reading it in place through slices.
+        """
+        return cls(None, source=data, **kwargs)
+
+    @classmethod
+    def from_stream(cls, stream, skip=STREAM_SKIP, **kwargs):
+        """
+        Parses a file from a forward-only stream, such as a pipe or a member
+        of an archive, by reading it to the end. Only the top-level boxes
+        not in `skip` are kept in memory, so boxes can be listed but the
+        contents of skipped ones (`mdat` by default) cannot be read.
+        """
+        return cls(None, source=SparseSource.read_boxes(stream, skip), **kwargs)
 
     def __enter__(self):
-        self.parent = open(self.path, "rb" if self.readonly else "rb+")
-        self.items = BoxList(self, 0)
+        if isinstance(self.source, SparseSource):
+            self.parent = self.source
+        elif self.source is not None:
+            self.parent = None
+            self._set_view(memoryview(self.source).cast('B'))
+        else:
+            self._open()
+        self.items = BoxList(self, 0, self.specialised)
         return super().__enter__()
 
+    def _open(self):
+        self.parent = open(self.path, "rb" if self.readonly else "rb+")
+        if self.use_mmap and self.size > 0:
+            # edits are recorded as spans, so the mapping itself never needs
+            # to be writable.
+            self._mmap = mmap.mmap(self.parent.fileno(), 0, access=mmap.ACCESS_READ)
+            self._set_view(memoryview(self._mmap))
+        elif self.cache_blocks > 0:
+            # header fields are read a few bytes at a time, so serve them
+            # from read-ahead blocks instead of one syscall each.
+            self.parent = BlockCache(self.parent, self.block_size, self.cache_blocks)
+
     def __exit__(self, _1, _2, _3):
         super().__exit__(_1, _2, _3)
-        self.parent.close()
+        if self._view is not None:
+            self._release_view()
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+        if self.parent:
+            self.parent.close()
+
+    def commit(self, dst):
+        """
+        Writes the file with all edits applied to the unbuffered file object
+        `dst`. Unedited regions are copied straight from the source file,
+        or from memory for files not read from a path.
+        """
+        for segment in self.segments():
+            if type(segment) != tuple:
+                dst.write(segment)
+            elif self.path is None:
+                dst.write(self._read_source(*segment))
+            else:
+                copy_range(self.parent, dst, *segment)
+
+    def _read_source(self, offset: int, length: int) -> bytes:
+        if self._view is not None:
+            return self._view[offset:offset + length]
+        self.parent.seek(offset)
+        return self.parent.read(length)
+
+    def save_as(self, dest: str):
+        if self.path and os.path.exists(dest) and os.path.samefile(self.path, dest):
+            raise Exception("Cannot rewrite %s in place" % dest)
+
+        with open(dest, 'wb', buffering=0) as out:
+            self.commit(out)
 
     def find(self, type: bytes) -> Box:
         for box in self.items:
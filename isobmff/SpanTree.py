@@ -0,0 +1,240 @@
+import random
+
+
+class _Node(object):
+    __slots__ = ('span', 'key', 'size', 'total', 'priority', 'left', 'right', 'parent')
+
+    def __init__(self, span, key: int, size: int):
+        self.span = span
+        self.key = key
+        self.size = size
+        self.total = size
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.parent = None
+
+
+def _total(node: _Node) -> int:
+    return node.total if node else 0
+
+
+def _first(node: _Node) -> _Node:
+    while node and node.left:
+        node = node.left
+    return node
+
+
+def _last(node: _Node) -> _Node:
+    while node and node.right:
+        node = node.right
+    return node
+
+
+def _update(node: _Node) -> _Node:
+    node.total = _total(node.left) + node.size + _total(node.right)
+    if node.left:
+        node.left.parent = node
+    if node.right:
+        node.right.parent = node
+    return node
+
+
+class SpanTree(object):
+    """
+    The spans of a BoundedBuffer, kept in a treap ordered by position. Each
+    node caches the size of its subtree, so finding the span at an offset and
+    replacing a range of spans take O(log n) instead of rebuilding the list.
+
+    Every span is keyed by the offset in the buffer's original content it
+    starts at, so that `translate` can map an original offset (such as the
+    one a child box was parsed at) to its current position after edits.
+    `translate` searches the tree by key, so keys never decrease from one
+    span to the next; `replace` refuses spans that would break that order.
+
+    `owner` provides `_size(span)` and `_cut(span, at)`.
+    """
+
+    def __init__(self, owner, size: int):
+        self.owner = owner
+        self.count = 0
+        self._children = {}
+        self.root = self._node((0, size), 0) if size > 0 else None
+
+    def _node(self, span, key: int) -> _Node:
+        node = _Node(span, key, self.owner._size(span))
+        if not isinstance(span, (tuple, bytes, bytearray)):
+            self._children[id(span)] = node
+        self.count += 1
+        return node
+
+    def _forget(self, node: _Node):
+        if node:
+            self._children.pop(id(node.span), None)
+            self.count -= 1
+            self._forget(node.left)
+            self._forget(node.right)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.span
+            node = node.right
+
+    def _merge(self, a: _Node, b: _Node) -> _Node:
+        if not a:
+            return b
+        if not b:
+            return a
+        if a.priority > b.priority:
+            a.right = self._merge(a.right, b)
+            return _update(a)
+        b.left = self._merge(a, b.left)
+        return _update(b)
+
+    def _split(self, node: _Node, pos: int):
+        """
+        Splits into the spans before `pos` and the spans from `pos` on,
+        cutting the span that straddles it. Empty spans at `pos` stay before.
+        """
+        if not node:
+            return (None, None)
+
+        left = _total(node.left)
+        if pos < left or (pos == left and node.size > 0):
+            (a, node.left) = self._split(node.left, pos)
+            return (a, _update(node))
+
+        if pos >= left + node.size:
+            (node.right, b) = self._split(node.right, pos - left - node.size)
+            return (_update(node), b)
+
+        (first, second) = self.owner._cut(node.span, pos - left)
+        self.count -= 1
+        head = self._node(first, node.key)
+        tail = self._node(second, second[0] if type(second) == tuple else node.key)
+        return (self._merge(node.left, head), self._merge(tail, node.right))
+
+    def _set_root(self, node: _Node):
+        self.root = node
+        if node:
+            node.parent = None
+
+    def _find(self, pos: int):
+        node = self.root
+        start = 0
+        last = None
+        while node:
+            left = _total(node.left)
+            if pos < start + left:
+                node = node.left
+            elif pos < start + left + node.size:
+                return (node, start + left)
+            else:
+                last = node
+                start += left + node.size
+                node = node.right
+        return (last, None)
+
+    def locate(self, pos: int):
+        """
+        The span containing `pos`, and the position it starts at.
+        """
+        (node, start) = self._find(pos)
+        if start is None:
+            return (None, _total(self.root))
+        return (node.span, start)
+
+    def original(self, pos: int) -> int:
+        """
+        The original offset of what is currently at `pos`. Inserted content
+        maps to the offset it was inserted at.
+        """
+        (node, start) = self._find(pos)
+        if not node:
+            return 0
+        if start is None:
+            return node.key + (node.size if type(node.span) == tuple else 0)
+        if type(node.span) == tuple:
+            return node.key + pos - start
+        return node.key
+
+    def translate(self, original: int) -> int:
+        """
+        The current position of what was at offset `original`. Offsets
+        within replaced content map to the start of the replacement.
+        """
+        node = self.root
+        start = 0
+        found = None
+        while node:
+            left = _total(node.left)
+            if node.key <= original:
+                found = (node, start + left)
+                start += left + node.size
+                node = node.right
+            else:
+                node = node.left
+
+        if not found:
+            return original
+        (node, pos) = found
+        if type(node.span) == tuple:
+            return pos + min(original - node.key, node.size)
+        return pos
+
+    def replace(self, pos: int, size: int, span, key: int = None):
+        """
+        Replaces the content in [pos, pos + size) with `span`.
+        """
+        if key is None:
+            key = self.original(pos)
+        for at in (pos, pos + size):
+            # Fail before restructuring anything if a boundary can't be cut.
+            (node, start) = self._find(at)
+            if start is not None and start < at:
+                self.owner._cut(node.span, at - start)
+
+        (before, rest) = self._split(self.root, pos)
+        (removed, after) = self._split(rest, size)
+
+        (last, first) = (_last(before), _first(after))
+        if (last and last.key > key) or (first and first.key < key):
+            self._set_root(self._merge(before, self._merge(removed, after)))
+            raise ValueError("Span key 0x%x is out of order at position %d" % (key, pos))
+
+        self._forget(removed)
+
+        if self.owner._size(span) > 0 or not isinstance(span, (tuple, bytes, bytearray)):
+            before = self._merge(before, self._node(span, key))
+        self._set_root(self._merge(before, after))
+
+    def position(self, child) -> int:
+        """
+        The current position of a child buffer.
+        """
+        node = self._children[id(child)]
+        pos = _total(node.left)
+        while node.parent:
+            if node is node.parent.right:
+                pos += _total(node.parent.left) + node.parent.size
+            node = node.parent
+        return pos
+
+    def refresh(self, child):
+        """
+        Picks up a change in the size of a child buffer.
+        """
+        node = self._children[id(child)]
+        node.size = self.owner._size(child)
+        while node:
+            node.total = _total(node.left) + node.size + _total(node.right)
+            node = node.parent
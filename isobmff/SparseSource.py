@@ -0,0 +1,117 @@
+from bisect import bisect_right
+from isobmff.BoundedBuffer import BufferShort
+from isobmff.Box import Box, InvalidSize
+
+
+class Unbuffered(Exception):
+    pass
+
+
+def read_exactly(stream, size: int) -> bytes:
+    """
+    Reads `size` bytes from `stream`, which may return less per call (as
+    pipes do). Returns less only at the end of the stream.
+    """
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class SparseSource(object):
+    """
+    The parts of a file that were kept in memory while reading it as a
+    stream, addressed by their offset in the file. Reading from a part that
+    was skipped raises `Unbuffered`.
+    """
+    SKIP_CHUNK = 1 << 20
+
+    def __init__(self):
+        self.size = 0
+        self._starts = []
+        self._parts = []
+        self._ptr = 0
+
+    def add(self, offset: int, data: bytes):
+        if self._parts and self._starts[-1] + len(self._parts[-1]) == offset:
+            self._parts[-1] += data
+        else:
+            self._starts.append(offset)
+            self._parts.append(bytearray(data))
+        self.size = max(self.size, offset + len(data))
+
+    def seek(self, offset: int):
+        self._ptr = offset
+
+    def read(self, size: int) -> bytes:
+        i = bisect_right(self._starts, self._ptr) - 1
+        if i < 0 or self._ptr + size > self._starts[i] + len(self._parts[i]):
+            raise Unbuffered("0x%08x-0x%08x was not kept from the stream" % (self._ptr, self._ptr + size))
+
+        start = self._ptr - self._starts[i]
+        self._ptr += size
+        return bytes(self._parts[i][start:start + size])
+
+    def close(self):
+        pass
+
+    @classmethod
+    def _skip(cls, stream, size: int) -> int:
+        """
+        Reads and discards `size` bytes of `stream`, or up to its end if
+        `size` is None. Returns the number of bytes skipped.
+        """
+        skipped = 0
+        while size is None or skipped < size:
+            chunk = stream.read(cls.SKIP_CHUNK if size is None else min(cls.SKIP_CHUNK, size - skipped))
+            if not chunk:
+                break
+            skipped += len(chunk)
+        return skipped
+
+    @classmethod
+    def read_boxes(cls, stream, skip=()) -> 'SparseSource':
+        """
+        Reads the top-level boxes of a forward-only `stream` to its end.
+        Boxes whose type is in `skip` are passed over, keeping only their
+        headers, so that they can still be listed.
+        """
+        source = cls()
+        offset = 0
+        while True:
+            header = read_exactly(stream, Box.HEADER.size)
+            if not header:
+                break
+            if len(header) < Box.HEADER.size:
+                raise BufferShort
+
+            (size, type) = Box.HEADER.unpack(header)
+            if size == 1:
+                header += read_exactly(stream, 8)
+                size = int.from_bytes(header[8:], byteorder='big')
+                if size < len(header):
+                    raise InvalidSize(type, offset, size)
+            elif 0 < size < len(header):
+                raise InvalidSize(type, offset, size)
+
+            body = size - len(header) if size else None
+            if type in skip:
+                source.add(offset, header)
+                length = cls._skip(stream, body)
+            else:
+                data = read_exactly(stream, body) if body is not None else stream.read()
+                source.add(offset, header + data)
+                length = len(data)
+
+            if body is not None and length < body:
+                raise BufferShort
+            size = len(header) + length
+
+            offset += size
+            source.size = offset
+
+        return source
@@ -0,0 +1,52 @@
+import errno
+import os
+from isobmff.BoundedBuffer import BufferShort
+
+COPY_BUFFER_SIZE = 1 << 20
+
+# errors meaning the kernel cannot copy between these two files, in which
+# case we fall back to the next strategy.
+UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+               errno.ENOTSOCK, errno.EBADF)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, length, offset)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    return os.sendfile(dst_fd, src_fd, offset, length)
+
+
+KERNEL_COPIES = [copy for (copy, name) in ((_copy_file_range, 'copy_file_range'), (_sendfile, 'sendfile'))
+                 if hasattr(os, name)]
+
+
+def copy_range(src, dst, offset: int, length: int):
+    """
+    Copies `length` bytes starting at `offset` of the file object `src` to the
+    current position of `dst`, letting the kernel do the copy where it can.
+
+    `dst` must be unbuffered (opened with `buffering=0`), since the copy goes
+    through its file descriptor.
+    """
+    for copy in KERNEL_COPIES:
+        try:
+            while length > 0:
+                n = copy(src.fileno(), dst.fileno(), offset, length)
+                if n == 0:
+                    raise BufferShort
+                offset += n
+                length -= n
+            return
+        except OSError as e:
+            if e.errno not in UNSUPPORTED:
+                raise
+
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_BUFFER_SIZE, length))
+        if not chunk:
+            raise BufferShort
+        dst.write(chunk)
+        length -= len(chunk)
@@ -1,79 +1,35 @@
-from io import BufferedRandom
-import os
-import sys
+"""
+Lists the `infe` entries of a HEIF file.
 
+The classes here are kept for older callers, and are thin wrappers around
+the `isobmff` and `heif` packages, which do the actual parsing. Box types
+are given as strings, as they used to be:
 
-class Sizeable(object):
-    def __init__(self, start: int, size: int):
-        self.size = size
-        self.start = start
-        self.end = start + size
+    with ISOBMFF(path) as f:
+        iinf = f.box("meta").child(4).find("iinf").cast(IINF)
+        for infe in iinf.entries():
+            print(infe)
 
-    def contains(self, ptr: int):
-        return ptr >= self.start and ptr < self.end
+`IINF.size` is still the entry count and `INFE.type` the item type, as
+they always were; the size and type of those boxes themselves are
+`IINF.box_size` and `INFE.box_type`.
+"""
 
-    def limits(self):
-        return "[min=%d, max=%d]" % (self.start, self.end)
+import os
+import sys
+from isobmff import Box as isobmff
+from isobmff.BoundedBuffer import BoundedBuffer
+from isobmff.BoxList import BoxList
+from isobmff.MediaFile import MediaFile
+from heif import meta as heif
 
 
-class ISOBMFF(Sizeable):
+class ISOBMFF(MediaFile):
     def __init__(self, path: str, readonly=True):
-        self.path = path
-        self.readonly = readonly
-        super().__init__(0, os.stat(path).st_size)
-
-    def __enter__(self):
-        self.fp = open(self.path, "rb" if self.readonly else "rb+")
-        self._ptr = 0
-        return self
-
-    def __exit__(self, __1, __2, __3):
-        if self.fp:
-            self.fp.close()
-        self.fp = None
-
-    def seek(self, offset):
-        if (offset < 0 or offset >= self.size):
-            raise Exception("Seek out of range.")
-        self.fp.seek(offset)
-        self._ptr = offset
-
-    def read(self, bytes: int, range_: Sizeable = None):
-        range_ = range_ or self
-
-        if not range_.contains(self._ptr + bytes):
-            raise Exception("buffer short")
-
-        self._ptr += bytes
-
-        return self.fp.read(bytes)
-
-    def read_cstring(self, range_: Sizeable = None):
-        self.bytes = b''
-        try:
-            c = self.read(1, range_)
-            while len(c) and c != b'\0':
-                self.bytes += c
-                c = self.read(1, range_)
-        except Exception:
-            pass
-
-        return self.bytes.decode('utf-8')
-
-    def read_int8(self, range_: Sizeable = None):
-        return int.from_bytes(self.read(1, range_), byteorder='big')
-
-    def read_int16_be(self, range_: Sizeable = None):
-        return int.from_bytes(self.read(2, range_), byteorder="big")
-
-    def read_int32_be(self, range_: Sizeable = None):
-        return int.from_bytes(self.read(4, range_), byteorder="big")
-
-    def read_int32_le(self, range_: Sizeable = None):
-        return int.from_bytes(self.read(4, range_), byteorder="little")
+        super().__init__(path, readonly, use_mmap=True)
 
     def boxes(self):
-        return Boxes(self, 0, self)
+        return Boxes(self, 0)
 
     def first(self):
         return self.boxes().first()
@@ -82,93 +38,62 @@ class ISOBMFF(Sizeable):
         return self.boxes().__iter__()
 
     def box(self, type: str):
-        for box in self:
-            if (box.type == type):
-                return box
+        return self.boxes().find(type)
 
 
 class Boxes(object):
-    def __init__(self, fp: ISOBMFF, offset: int, parent: Sizeable):
-        self.fp = fp
-        self.offset = offset
-        self.parent = parent
+    def __init__(self, buffer: BoundedBuffer, offset: int):
+        self._boxes = BoxList(buffer, offset)
 
     def first(self):
-        return Box(self.fp, self.offset, self.parent)
+        for box in self:
+            return box
 
     def __iter__(self):
-        self._iter = True
-        self._box = None
-        return self
-
-    def __next__(self):
-        if self._box:
-            self._box = self._box.next()
-
-        if self._box:
-            return self._box
-        elif self._iter:
-            self._box = self.first()
-            self._iter = False
-            return self._box
-        else:
-            self._box = None
-            raise StopIteration
+        for box in self._boxes:
+            yield Box(box)
 
     def find(self, type: str):
-        for box in self:
-            if type == box.type:
-                return box
-
-
-class Box(Sizeable):
-    def __init__(self, fp: ISOBMFF, offset: int, parent: Sizeable, type=None):
-        self.fp = fp
-        self.offset = offset
-        self.parent = parent
+        box = self._boxes.find(type.encode('utf-8'))
+        if box:
+            return Box(box)
 
-        fp.seek(offset)
-        self.size = int.from_bytes(
-            fp.read(4),
-            byteorder="big"
-        )
-        self.type = fp.read(4).decode("utf-8")
 
-        if type and self.type != type:
-            raise Exception(
-                "Invalid type! Expected %s, received %r" % (type, self.type))
-
-        super().__init__(self.offset, self.size)
+class Box(object):
+    def __init__(self, box: isobmff.Box):
+        self.box = box
+        self.offset = box.buffer.offs(box.offset)
+        self.size = box.size
+        self.type = box.type.decode('utf-8')
 
     def seek(self, offset=0):
-        self.fp.seek(self.offset + 8 + offset)
+        self.box.buffer.seek(self.box.offset + self.box.content_offset + offset)
 
     def next(self):
-        if self.size > 8 and self.parent.contains(self.offset + self.size + 8):
-            return Box(self.fp, self.offset + self.size, self.parent)
+        offset = self.box.next_offset()
+        if offset < self.box.buffer.size:
+            return Box(isobmff.Box(self.box.buffer, offset))
 
     def child(self, offset=0):
-        return Boxes(self.fp, self.offset + 8 + offset, self)
+        return Boxes(self.box.contents(), offset)
 
     def cast(self, specialised):
-        return specialised(self.fp, self.offset, self.parent)
+        return self.box.cast_to(specialised)
+
+    def __repr__(self):
+        return repr(self.box)
 
 
 class INFE(Box):
-    type = "infe"
-
-    def __init__(self, fp: ISOBMFF, offset: int, parent: Sizeable):
-        super().__init__(fp, offset, parent, INFE.type)
-        self.version = self.fp.read_int8(self.parent)
-        self.flags = int.from_bytes(self.fp.read(3), byteorder="big")
-        self.id = self.fp.read_int16_be(self.parent)
-        self.b = self.fp.read_int16_be(self.parent)
-        self.type = self.fp.read_cstring(self.parent)
-
-        if self.type == "mime":
-            self.subtype = self.fp.read_cstring(self.parent)
-        else:
-            self.subtype = None
+    def __init__(self, infe: heif.INFE):
+        super().__init__(infe)
+        self.box_type = self.type
+        self.version = infe.version
+        self.flags = infe.flags
+        self.id = infe.id
+        self.b = infe.reserved
+        self.type = infe.inf
+        self.subtype = infe.mime
 
     def __repr__(self) -> str:
         if not self.subtype:
@@ -178,25 +103,13 @@ class INFE(Box):
 
 
 class IINF(Box):
-    type = "iinf"
-
-    def __init__(self, fp: ISOBMFF, offset: int, parent: Sizeable):
-        super().__init__(fp, offset, parent, IINF.type)
-        self.seek(4)
-        self.size = self.fp.read_int16_be()
-        self._read_entries()
-
-    def _read_entries(self):
-        self._cnt = 0
-        self._entries = []
-        for box in self.child(6):
-            self._cnt += 1
-            self._entries.append(box.cast(INFE))
-        if self._cnt != self.size:
-            raise Exception("Invalid IINF box")
+    def __init__(self, buffer: BoundedBuffer, offset: int):
+        super().__init__(heif.IINF(buffer, offset))
+        self.box_size = self.size
+        self.size = self.box.count
 
     def entries(self):
-        return self._entries
+        return [INFE(infe) for infe in self.box]
 
 
 if __name__ == "__main__":
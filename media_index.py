@@ -0,0 +1,284 @@
+"""
+Index of the photos and movies under a directory tree, built from their
+HEIF and QuickTime headers alone.
+
+For every file the index keeps the top-level box layout, the HEIF item table,
+whether the file carries XMP and is already a Motion Photo, and the `mvhd`
+fields of movies. Entries are keyed on path, size and modification time, so
+updating the index only re-parses the files that changed since the last run.
+
+Usage:
+
+python3 ./media_index.py [--jobs N] /path/to/photos [...]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from tqdm import tqdm
+from parallel import bounded_map, positive_int
+from heif.HeifFile import HeifFile, MOTION_PHOTO_PROPERTIES
+from heif.content import XMP_MIME
+from qt.probe import probe
+
+INDEX_PATH = os.path.expanduser('~/.cache/media_index.sqlite')
+
+HEIF_EXTENSIONS = ('.heic', '.heif')
+MOVIE_EXTENSIONS = ('.mov', '.mp4')
+
+# where motion_photo.py writes its outputs, next to the photos.
+WORKING_DIR = '__working__'
+
+
+class Entry(object):
+    """
+    What the index knows about one file. `error` is set instead of the
+    parsed fields for files that could not be parsed.
+    """
+    COLUMNS = ('path', 'size', 'mtime_ns', 'kind', 'boxes', 'items', 'has_xmp',
+               'motion_photo', 'time_scale', 'duration', 'duration_us',
+               'tracks', 'width', 'height', 'error')
+
+    def __init__(self, path, size, mtime_ns, kind, boxes=(), items=(), has_xmp=False,
+                 motion_photo=False, time_scale=None, duration=None, duration_us=None,
+                 tracks=None, width=None, height=None, error=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.kind = kind
+        self.boxes = boxes                  # (type, offset, size) of top-level boxes
+        self.items = items                  # (id, inf, mime) of HEIF items
+        self.has_xmp = bool(has_xmp)
+        self.motion_photo = bool(motion_photo)
+        self.time_scale = time_scale
+        self.duration = duration
+        self.duration_us = duration_us
+        self.tracks = tracks
+        self.width = width
+        self.height = height
+        self.error = error
+
+    @classmethod
+    def from_row(cls, row):
+        entry = cls(*row)
+        entry.boxes = [tuple(box) for box in json.loads(entry.boxes)]
+        entry.items = [tuple(item) for item in json.loads(entry.items)]
+        return entry
+
+    def row(self):
+        values = [getattr(self, name) for name in Entry.COLUMNS]
+        values[4] = json.dumps(self.boxes)
+        values[5] = json.dumps(self.items)
+        return values
+
+    def is_current(self, stat):
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+    def __repr__(self):
+        return "<Entry %s %s size=%d%s>" % (self.kind, self.path, self.size,
+                                            " motion_photo" if self.motion_photo else "")
+
+
+def kind_of(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in HEIF_EXTENSIONS:
+        return 'heif'
+    if ext in MOVIE_EXTENSIONS:
+        return 'movie'
+
+
+def describe(path):
+    """
+    Parses the headers of the file at `path` into an `Entry`. Only the box
+    headers, `meta` and `moov` are read; image and sample data are not.
+    """
+    # the index is keyed on absolute paths, whatever the caller passed.
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    kind = kind_of(path)
+    entry = Entry(path, stat.st_size, stat.st_mtime_ns, kind)
+    try:
+        if kind == 'heif':
+            _describe_heif(entry)
+        elif kind == 'movie':
+            _describe_movie(entry)
+    except Exception as e:
+        entry.error = "%s: %s" % (type(e).__name__, e)
+    return entry
+
+
+def _describe_heif(entry):
+    with HeifFile(entry.path, use_mmap=True) as f:
+        entry.boxes = [(box.type.decode('ascii', 'replace'), box.offset, box.size) for box in f.items]
+        meta = f.meta
+        if not meta:
+            return
+
+        entry.items = [(infe.id, infe.inf, infe.mime) for infe in meta.iinf]
+        for chunk in f.content.chunks_with_mime(XMP_MIME) if f.content else ():
+            entry.has_xmp = True
+            properties = chunk.properties(*MOTION_PHOTO_PROPERTIES)
+            if properties.get('GCamera:MotionPhoto') == '1':
+                entry.motion_photo = True
+
+
+def _describe_movie(entry):
+    summary = probe(entry.path)
+    entry.time_scale = summary.time_scale
+    entry.duration = summary.duration
+    entry.duration_us = summary.duration_us
+    entry.tracks = summary.track_count()
+    (entry.width, entry.height) = summary.dimensions() or (None, None)
+
+
+def walk(root):
+    """
+    Yields the paths of the photos and movies under `root`, skipping the
+    working folders of `motion_photo.py`.
+    """
+    for (d, dirs, files) in os.walk(root):
+        dirs[:] = sorted(name for name in dirs if name != WORKING_DIR)
+        for name in sorted(files):
+            if kind_of(name):
+                yield os.path.join(d, name)
+
+
+class MediaIndex(object):
+    """
+    The entries of indexed files by absolute path. An entry is only handed
+    out while the file's size and modification time still match it, so a
+    lookup never needs to open the file itself. New entries are kept in
+    memory until `batch_size` of them are pending or the index is closed.
+    """
+
+    def __init__(self, path=INDEX_PATH, batch_size=100):
+        self.batch_size = batch_size
+        self.pending = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS media (
+            PATH text primary key,
+            SIZE integer,
+            MTIME_NS integer,
+            KIND text,
+            BOXES text,
+            ITEMS text,
+            HAS_XMP integer,
+            MOTION_PHOTO integer,
+            TIME_SCALE integer,
+            DURATION integer,
+            DURATION_US integer,
+            TRACKS integer,
+            WIDTH integer,
+            HEIGHT integer,
+            ERROR text
+        )
+        """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _1, _2, _3):
+        self.close()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def _stored(self, path):
+        if path in self.pending:
+            return self.pending[path]
+        row = self.conn.execute("SELECT * FROM media WHERE PATH = ?", (path,)).fetchone()
+        return row and Entry.from_row(row)
+
+    def cached(self, path):
+        """
+        The entry for `path` if it is indexed and the file did not change
+        since, or None.
+        """
+        path = os.path.abspath(path)
+        entry = self._stored(path)
+        try:
+            if entry and entry.is_current(os.stat(path)):
+                return entry
+        except FileNotFoundError:
+            return None
+
+    def get(self, path):
+        """
+        The entry for `path`, parsing the file if it is not indexed or
+        changed since it was.
+        """
+        path = os.path.abspath(path)
+        return self.cached(path) or self.record(describe(path))
+
+    def record(self, entry):
+        self.pending[entry.path] = entry
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return entry
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany("""
+            INSERT OR REPLACE INTO media VALUES ({})
+            """.format(", ".join("?" * len(Entry.COLUMNS))),
+                [entry.row() for entry in self.pending.values()])
+        self.pending = {}
+
+    def update(self, root, jobs=1):
+        """
+        Brings the index up to date with the files under `root`, parsing the
+        new and changed ones with `jobs` worker processes, and forgetting the
+        ones that were removed. Returns the number of files parsed.
+        """
+        root = os.path.abspath(root)
+        seen = set()
+        stale = []
+        for path in walk(root):
+            seen.add(path)
+            if not self.cached(path):
+                stale.append(path)
+
+        failed = 0
+        for (path, entry, error) in tqdm(bounded_map(describe, stale, jobs), total=len(stale)):
+            if error:
+                # the file went away while scanning
+                tqdm.write("[!!] {}: {}".format(path, error))
+                failed += 1
+            else:
+                self.record(entry)
+
+        self.flush()
+        # outputs in working folders are recorded by motion_photo.py rather
+        # than walked, so they are only forgotten once they are deleted.
+        prefix = os.path.join(root, '')
+        gone = [(path,) for (path,) in self.conn.execute(
+            "SELECT PATH FROM media WHERE substr(PATH, 1, ?) = ?", (len(prefix), prefix))
+            if path not in seen and not (WORKING_DIR in path.split(os.sep) and os.path.exists(path))]
+        with self.conn:
+            self.conn.executemany("DELETE FROM media WHERE PATH = ?", gone)
+
+        return len(stale) - failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the photos and movies under a folder.")
+    parser.add_argument("path", nargs="+")
+    parser.add_argument("--jobs", "-j", type=positive_int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--index", default=INDEX_PATH,
+                        help="where to keep the index")
+    args = parser.parse_args()
+
+    with MediaIndex(args.index) as index:
+        for root in args.path:
+            parsed = index.update(os.path.expanduser(root), args.jobs)
+            print("{}: {} file(s) parsed.".format(root, parsed))
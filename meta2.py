@@ -9,5 +9,5 @@ from qt.QuickTimeFile import QuickTimeFile
 
 if __name__ == "__main__":
     file = os.path.expanduser(sys.argv[1])
-    with QuickTimeFile(file) as f:
+    with QuickTimeFile(file, use_mmap=True) as f:
         print(f.moov.mvhd)
@@ -4,12 +4,10 @@ single Motion Photo file (HEIF format) that can be understood as Motion Photo
 in Google Photos.
 
 Requires the following to be installed and inside PATH:
-1. exiftool
-2. adb
+1. adb
 
 Requires the following python packages
-1. opencv_python
-2. tqdm
+1. tqdm
 
 This file is meant to be run with command line access to the iPhone storage
 in either Windows or Linux. For Mac, you can sync up the photos with Photos.app
@@ -17,16 +15,33 @@ and use `photo_sync.py` to copy the photos that way.
 
 Usage:
 
-python3 ./motion_photo.py /path/to/photos
+python3 ./motion_photo.py [--jobs N] /path/to/photos
+
+With `--jobs N`, photos are converted by N worker processes while this
+process pushes the results to the device in order.
+
+A photo is not converted again if its output in `__working__` is a Motion
+Photo written after the photo and its movie last changed. Outputs are
+recorded in the media index (see `media_index.py`), so an unchanged output is
+only parsed once.
 
 """
 
+import argparse
+import functools
 import os
-import sys
-import cv2
-import shutil
-import subprocess
 from tqdm import tqdm
+from convert_cache import ConversionCache
+import media_index
+from media_index import WORKING_DIR, MediaIndex
+from parallel import bounded_map, positive_int
+from transfer import Device
+from heif.writer import HeifWriter
+from qt.probe import probe
+
+# Bump whenever the output for the same inputs changes, so that outputs
+# cached by an older version are not reused.
+CONVERTER_VERSION = 1
 
 
 def get_file_with_movie(name, d, wd):
@@ -34,19 +49,16 @@ def get_file_with_movie(name, d, wd):
     img_file = d + names + '.' + ext
     mov_file = d + names + '.mov'
     mp_file = wd + names + '.' + ext
-    xmp_file = wd + names + '.xmp'
 
-    return img_file, mov_file, mp_file, xmp_file
+    return img_file, mov_file, mp_file
 
 
 def get_quicktime_duration_us(movie_file):
     """
-    Get the duration of a QuickTime movie file in microseconds
+    Get the duration of a QuickTime movie file in microseconds, as recorded
+    in its `moov/mvhd` header, or 0 if the header has no time scale.
     """
-    cap = cv2.VideoCapture(movie_file)
-    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    return round(frames / fps * 1000000)
+    return probe(movie_file).duration_us or 0
 
 
 def get_xmp_metadata(movie_file):
@@ -98,82 +110,132 @@ def get_xmp_metadata(movie_file):
     return data, file_size
 
 
+def convert_image(file, d, wd, cache=None):
+    (img_file, movie_file, mp_file) = get_file_with_movie(file, d, wd)
+    save_image_with_paths(img_file, movie_file, mp_file, cache)
+    return mp_file
+
+
+def describe_output(img_file, movie_file, mp_file, entry=None):
+    """
+    The media index entry of `mp_file` if it was written after both inputs
+    last changed, or None. The file is parsed unless its indexed `entry` is
+    given.
+    """
+    try:
+        written = os.stat(mp_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if any(os.stat(p).st_mtime_ns > written for p in (img_file, movie_file)):
+        return None
+    return entry or media_index.describe(mp_file)
+
+
+def convert_or_reuse(item, d, wd, cache=None, reuse=True):
+    """
+    `convert_image` for a `(file, entry)` pair, where `entry` is the indexed
+    output of `file` if any. With `reuse`, an up-to-date output is kept as
+    it is. Returns the output, its media index entry (None without `reuse`),
+    and whether it was reused.
+    """
+    (file, entry) = item
+    (img_file, movie_file, mp_file) = get_file_with_movie(file, d, wd)
+    if reuse:
+        output = describe_output(img_file, movie_file, mp_file, entry)
+        if output and output.motion_photo:
+            return (mp_file, output, True)
+
+    save_image_with_paths(img_file, movie_file, mp_file, cache)
+    return (mp_file, media_index.describe(mp_file) if reuse else None, False)
+
+
 def save_image(file, d, wd):
-    (img_file, movie_file, mp_file, xmp_file) = get_file_with_movie(file, d, wd)
-    save_image_with_paths(img_file, movie_file, mp_file, xmp_file)
-    push_to_device(mp_file)
-
-
-def save_image_with_paths(img_file, movie_file, mp_file, xmp_file):
-    shutil.copyfile(img_file, mp_file)
-
-    # write XMP sidecar
-    (metadata, movie_file_size) = get_xmp_metadata(movie_file)
-    with open(xmp_file, "w") as f:
-        f.write(metadata)
-
-    # attach XMP to the file
-    subprocess.run(["exiftool", "-xmp<={}".format(xmp_file),
-                   mp_file], stdout=subprocess.DEVNULL)
-
-    # For iPhone photos, the mdat box is the last box, and is set
-    # to the size 1. Since we're appending another box to the end,
-    # we must set it to the actual byte value, so that the file
-    # parser knows where the end of the mdat box is.
-    mp_file_size = os.stat(mp_file).st_size
-    ptr = 0
-    with open(mp_file, 'rb+') as img:
-        type = ''
-
-        while type != 'mdat':
-            img.seek(ptr)
-            size = int.from_bytes(
-                img.read(4),
-                byteorder='big'
-            )
-            type = img.read(4).decode('utf-8')
-            if type != 'mdat':
-                ptr += size
-
-        img.seek(ptr)
-        mdat_size = mp_file_size - ptr
-        img.write(mdat_size.to_bytes(4, byteorder='big'))
-
-    # append the video file behind
-    buffer_size = 1000
-    ptr = None
-    with open(mp_file, 'ab') as img:
-        # create the `mpvd` box
-        img.write((movie_file_size + 8).to_bytes(4, byteorder='big'))
-        img.write(b"mpvd")
-        # write the movie file
-        with open(movie_file, 'rb') as mov:
-            b = None
-            while not b or len(b) == buffer_size:
-                b = mov.read(buffer_size)
-                img.write(b)
+    push_to_device(convert_image(file, d, wd))
+
+
+class MotionPhotoWriter(HeifWriter):
+    """
+    Plans the whole Motion Photo up front and writes it in one sequential
+    pass: the HEIF boxes with the XMP attached, `mdat` with its actual size
+    (so the file parser knows where it ends), and the movie wrapped in an
+    `mpvd` box behind it.
+    """
+
+    def __init__(self, img_file, movie_file):
+        super().__init__(img_file)
+        (metadata, _) = get_xmp_metadata(movie_file)
+        self.set_xmp(metadata.encode('utf-8'))
+        self.append_box(b'mpvd', movie_file)
+
+
+def save_image_with_paths(img_file, movie_file, mp_file, cache=None):
+    if not cache:
+        MotionPhotoWriter(img_file, movie_file).write(mp_file)
+        return
+
+    cache.fetch_or_build(
+        cache.key([img_file, movie_file]),
+        mp_file,
+        MotionPhotoWriter(img_file, movie_file).write)
 
 
 def push_to_device(mp_file):
     # push file to Android device
-    subprocess.run(["adb", "push", mp_file, "/sdcard/DCIM/Camera"])
+    with Device(batch_size=1) as device:
+        device.push(mp_file)
 
 
-def process_motion_photos(path):
+def process_motion_photos(path, jobs=1, cache=None, index=None):
     if not os.path.exists(path):
         exit("[!!] Folder does not exist!")
 
     d = path if path.endswith("/") else path + '/'
-    workingdir = d + '__working__/'
+    workingdir = d + WORKING_DIR + '/'
     if not os.path.exists(workingdir):
         os.mkdir(workingdir)
 
     path = [p for p in os.listdir(path) if p.lower().endswith(".heic")]
-
-    for file in tqdm(path):
-        save_image(file, d, workingdir)
+    failed = []
+    reused = 0
+
+    convert = functools.partial(convert_or_reuse, d=d, wd=workingdir, cache=cache, reuse=bool(index))
+    # only the index lookups happen here; outputs are parsed by the workers.
+    items = ((file, index and index.cached(workingdir + file)) for file in path)
+
+    with Device() as device:
+        for ((file, _), result, error) in tqdm(bounded_map(convert, items, jobs), total=len(path)):
+            if error:
+                tqdm.write("[!!] {}: {}".format(file, error))
+                failed.append(file)
+                continue
+
+            (mp_file, entry, was_reused) = result
+            if entry:
+                index.record(entry)
+            reused += was_reused
+            device.push(mp_file)
+
+    if reused:
+        print("{} photo(s) already converted.".format(reused))
+    if reused < len(path):
+        print("{} of {} photo(s) converted.".format(len(path) - len(failed) - reused, len(path) - reused))
+    if failed:
+        print("failed: {}".format(", ".join(failed)))
 
 
 if __name__ == "__main__":
-    file = os.path.expanduser(sys.argv[1])
-    process_motion_photos(file)
+    parser = argparse.ArgumentParser(description="Merge Live Photos into Motion Photos.")
+    parser.add_argument("path")
+    parser.add_argument("--jobs", "-j", type=positive_int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always convert instead of reusing cached outputs")
+    parser.add_argument("--no-index", action="store_true",
+                        help="always convert instead of reusing earlier outputs in __working__")
+    args = parser.parse_args()
+    cache = None if args.no_cache else ConversionCache(version=CONVERTER_VERSION)
+    if args.no_index:
+        process_motion_photos(os.path.expanduser(args.path), args.jobs, cache)
+    else:
+        with MediaIndex() as index:
+            process_motion_photos(os.path.expanduser(args.path), args.jobs, cache, index)
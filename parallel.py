@@ -0,0 +1,65 @@
+"""
+Helpers for running per-file work across a process pool.
+"""
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def cpu_count() -> int:
+    return os.cpu_count() or 1
+
+
+def positive_int(value: str) -> int:
+    """
+    argparse type for `--jobs` and similar counts.
+    """
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, got %d" % n)
+    return n
+
+
+def bounded_map(fn, items, jobs=1, in_flight=None):
+    """
+    Calls `fn` on every item of `items` using `jobs` worker processes, and
+    yields `(item, result, error)` in input order. An exception raised by `fn`
+    is returned as `error` instead of aborting the remaining items.
+
+    At most `in_flight` items (twice the number of jobs by default) are
+    submitted at any time, so `items` can be a lazy iterator over a large
+    collection. With a single job the work runs in this process.
+    """
+    if jobs < 1:
+        raise ValueError("jobs must be at least 1, got %d" % jobs)
+
+    if jobs == 1:
+        for item in items:
+            try:
+                yield (item, fn(item), None)
+            except Exception as e:
+                yield (item, None, e)
+        return
+
+    in_flight = in_flight or jobs * 2
+    pending = deque()
+    items = iter(items)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            while len(pending) < in_flight:
+                item = next(items, pending)
+                if item is pending:
+                    break
+                pending.append((item, pool.submit(fn, item)))
+
+            if not pending:
+                return
+
+            (item, future) = pending.popleft()
+            try:
+                yield (item, future.result(), None)
+            except Exception as e:
+                yield (item, None, e)
@@ -6,28 +6,46 @@ This script will also convert Live Photos to a compatible format that is
 understandable by Google Photos.
 
 Requires the following to be installed and inside PATH:
-1. exiftool
-2. adb
+1. adb
 
 Requires the following python packages
-1. opencv_python
-2. tqdm
+1. tqdm
 
 This script is meant to be run on a Mac, where you have the ability to sync
 photos over to Photos.app. On Windows or Linux, use `motion_photo.py` to copy
 the image files directly. 
+
+With `--pipeline N`, photos are pushed to the device while later ones are
+still being converted, and at most N converted files are kept in `out/`.
+
+Syncs are incremental: only assets added or modified since the last
+complete sync are considered, and a modified asset is only exported again
+if its files changed. Photos skipped by an earlier run (e.g. unsupported JPEG
+Live Photos) are not retried unless `--full` is given.
+
+Converted Live Photos are cached by content (see `convert_cache.py`), so a
+photo synced again, or from another album, is not converted twice.
 """
 
+import argparse
+import functools
+import queue
 import sqlite3
 import os
 import motion_photo
 import shutil
-import subprocess
+import threading
 from tqdm import tqdm
+from convert_cache import ConversionCache
+from transfer import Device
 
 # Where the Photos Library package sits. This should be ~/Pictures by default
 PHOTO_LIB_DIR = os.path.expanduser('~/Pictures/Photos Library.photoslibrary')
 
+# Sidecar database recording which photos have been exported, so that we
+# never write to Photos.sqlite itself.
+LEDGER_PATH = os.path.expanduser('~/.photo_sync.sqlite')
+
 
 def path(p):
     return PHOTO_LIB_DIR + p
@@ -44,8 +62,9 @@ class Photo(object):
     all FaceTime photos are stored as `lp_image.heic`.
     """
 
-    def __init__(self, pk, subtype, filename, uuid, originalFilename, exported):
+    def __init__(self, pk, subtype, filename, uuid, originalFilename, exported, modified=None):
         self.pk = pk                            # photo primary key
+        self.modified = modified                # ZMODIFICATIONDATE of the asset
         self.uuid = uuid                        # photo UUID
         self.update_filename(originalFilename or filename)
         self.ext = filename.split(".")[1]       # extension. either `jpeg` or `heic`
@@ -112,12 +131,13 @@ class Photo(object):
             self.movie_path = path(
                 "/originals/{}/{}_3.mov".format(filename[0], self.uuid))
 
-    def copy_to_output(self, output_folder):
+    def copy_to_output(self, output_folder, cache=None):
         """
         Process the photo to store to the Android device's camera roll.
 
         If the photo is a live photo, embed the video such that Google Photos
-        treats it as a motion photo.
+        treats it as a motion photo, reusing the output from `cache` if this
+        pair of files has been converted before.
         """
         output = output_folder + self.filename
         print(output, self.subtype, self.ext, self.original, self.uuid, self.pk, self.filename, self.dest_ext)
@@ -132,46 +152,142 @@ class Photo(object):
             # to GCamera output.
             print("JPEG Live Photos are not supported yet")
         else:
-            xmp_file = output_folder + self.uuid + ".xmp"
             motion_photo.save_image_with_paths(
                 self.original,
                 self.movie_path,
                 output,
-                xmp_file
+                cache
             )
-            os.remove(xmp_file)
-            os.remove(output + "_original")
             self.copied_to_output = True
 
-    def push_to_device(self, cursor, conn):
+    def push_to_device(self, device, on_done=None):
         """
-        Push this to the Android device using ADB.
+        Queue this for the Android device. `on_done` is called once its batch
+        has been pushed.
         """
-        motion_photo.push_to_device(self.__output_filename)
-        subprocess.run(["adb", "shell", "am", "broadcast",
-                        "-a", "android.intent.action.MEDIA_SCANNER_SCAN_FILE",
-                        "-d", "file:///sdcard/DCIM/Camera/{}".format(self.filename)])
-        
-        # Pixel 2 XL file location
-        subprocess.run(["adb", "shell", "am", "broadcast",
-                        "-a", "android.intent.action.MEDIA_SCANNER_SCAN_FILE",
-                        "-d", "file:///storage/emulated/0/DCIM/Camera/{}".format(self.filename)])
-        cursor.execute("""
-        INSERT INTO ext_google_photo_export (PK, EXPORTED) values ({}, 1)
-        """.format(self.pk))
-        conn.commit()
-
-def setup_connection(conn):
-    cur = conn.cursor()
+        device.push(self.__output_filename, on_done)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS ext_google_photo_export (
-        PK integer primary key,
-        EXPORTED integer
-    )
-    """)
+    def remove_output(self):
+        os.remove(self.__output_filename)
+
+    def content_hash(self):
+        """
+        Fingerprint of the original file(s) of this photo, used to tell
+        content changes apart from metadata-only modifications. Photos.app
+        writes a new file for every edit, so the size and modification time
+        of each file are enough, and the files are never read.
+        """
+        paths = [self.original, self.movie_path] if self.subtype == 'live_photo' else [self.original]
+        return ";".join("%d:%d" % (stat.st_size, stat.st_mtime_ns) for stat in map(os.stat, paths))
+
+    def mark_exported(self, ledger):
+        ledger.record(self.pk, self.modified, self.content_hash())
+
+class ExportLedger(object):
+    """
+    The export bookkeeping, kept in a sidecar SQLite database (in WAL mode)
+    that is attached to the Photos library connection as `ledger`.
+
+    Exported photos are buffered and written with a single `executemany`
+    per `batch_size` photos. Leaving the `with` block, including through
+    an exception or Ctrl-C, writes whatever is still buffered.
+    """
+
+    def __init__(self, conn, path=LEDGER_PATH, batch_size=100):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = []
+
+        conn.execute("ATTACH DATABASE ? AS ledger", (path,))
+        conn.execute("PRAGMA ledger.journal_mode=WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ledger.ext_google_photo_export (
+            PK integer primary key,
+            EXPORTED integer,
+            MODIFIED real,
+            HASH text
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ledger.sync_state (
+            KEY text primary key,
+            VALUE
+        )
+        """)
+        self._add_columns()
+        self._migrate()
+
+    def _add_columns(self):
+        columns = [row[1] for row in self.conn.execute(
+            "PRAGMA ledger.table_info(ext_google_photo_export)")]
+        for (name, type) in (("MODIFIED", "real"), ("HASH", "text")):
+            if name not in columns:
+                self.conn.execute("ALTER TABLE ledger.ext_google_photo_export ADD COLUMN {} {}".format(name, type))
+
+    def _migrate(self):
+        """
+        Earlier versions kept the table inside Photos.sqlite; carry those
+        rows over.
+        """
+        res = self.conn.execute("""
+        SELECT name FROM main.sqlite_master
+        WHERE type = 'table' AND name = 'ext_google_photo_export'
+        """)
+        if res.fetchone():
+            with self.conn:
+                self.conn.execute("""
+                INSERT OR IGNORE INTO ledger.ext_google_photo_export (PK, EXPORTED)
+                SELECT PK, EXPORTED FROM main.ext_google_photo_export
+                """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _1, _2, _3):
+        self.flush()
+
+    def record(self, pk, modified=None, hash=None):
+        self.pending.append((pk, modified, hash))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany("""
+            INSERT OR REPLACE INTO ledger.ext_google_photo_export (PK, EXPORTED, MODIFIED, HASH)
+            VALUES (?, 1, ?, ?)
+            """, self.pending)
+        self.pending = []
+
+    def exported_hash(self, pk):
+        row = self.conn.execute("""
+        SELECT HASH FROM ledger.ext_google_photo_export WHERE PK = ?
+        """, (pk,)).fetchone()
+        return row and row[0]
+
+    def library_mark(self):
+        """
+        The newest asset key and modification date currently in the library.
+        """
+        return self.conn.execute("""
+        SELECT coalesce(max(Z_PK), 0), coalesce(max(ZMODIFICATIONDATE), 0) FROM ZAsset
+        """).fetchone()
+
+    def high_water_mark(self):
+        """
+        The library mark as of the start of the last complete sync.
+        """
+        state = dict(self.conn.execute("SELECT KEY, VALUE FROM ledger.sync_state"))
+        return (state.get("last_pk", 0), state.get("last_modified", 0))
 
-    return cur
+    def set_high_water_mark(self, pk, modified):
+        self.flush()
+        with self.conn:
+            self.conn.executemany("""
+            INSERT OR REPLACE INTO ledger.sync_state (KEY, VALUE) VALUES (?, ?)
+            """, [("last_pk", pk), ("last_modified", modified)])
 
 
 def get_albums_to_upload(cur):
@@ -194,88 +310,190 @@ def get_photos_to_upload_for_album(cur, album_key):
         ZFilename,
         ZUUID,
         ZOriginalFilename,
-        EXPORTED
+        EXPORTED,
+        a.ZMODIFICATIONDATE
     FROM
         ZAsset a
         LEFT JOIN ZAdditionalAssetAttributes aa on aa.ZAsset = a.Z_PK
-        LEFT JOIN ext_google_photo_export e on e.PK = a.Z_PK
+        LEFT JOIN ledger.ext_google_photo_export e on e.PK = a.Z_PK
         LEFT JOIN Z_29Assets lookup on lookup.Z_3Assets = a.Z_PK
     WHERE
         EXPORTED is null
-        AND lookup.Z_29Albums = %s
-    """%(album_key))
+        AND lookup.Z_29Albums = ?
+    """, (album_key,))
 
-    photos = []
+    for row in res:
+        yield Photo(*row)
 
-    for row in res.fetchall():
-        print(row)
-        photos.append(Photo(*row))
-
-    return photos
+def get_photos_to_upload(cur, ledger, incremental=True):
+    """
+    Yields the photos that were never exported or whose files changed since
+    they were. When `incremental`, only assets past the high-water mark of the
+    last complete sync are considered.
+    """
+    (last_pk, last_modified) = ledger.high_water_mark() if incremental else (0, 0)
 
-def get_photos_to_upload(cur):
+    # the assets past either mark, as a union of two queries rather than an
+    # OR, so that each one can use an index.
     res = cur.execute("""
+    WITH changed(PK) AS (
+        SELECT Z_PK FROM ZAsset WHERE Z_PK > ?
+        UNION
+        SELECT Z_PK FROM ZAsset WHERE ZMODIFICATIONDATE > ?
+    )
     SELECT
         a.Z_PK,
         ZKindSubtype,
         ZFilename,
         ZUUID,
         ZOriginalFilename,
-        EXPORTED
+        EXPORTED,
+        a.ZMODIFICATIONDATE
     FROM
-        ZAsset a
+        changed
+        JOIN ZAsset a on a.Z_PK = changed.PK
         LEFT JOIN ZAdditionalAssetAttributes aa on aa.ZAsset = a.Z_PK
-        LEFT JOIN ext_google_photo_export e on e.PK = a.Z_PK
+        LEFT JOIN ledger.ext_google_photo_export e on e.PK = a.Z_PK
     WHERE
-        EXPORTED is null
-    """)
-
-    photos = []
-
-    for row in res.fetchall():
-        print(row)
-        photos.append(Photo(*row))
-
-    return photos
-
-def upload_photos(photos):
-    count = 0
+        EXPORTED is null OR a.ZMODIFICATIONDATE > e.MODIFIED
+    """, (last_pk, last_modified))
+
+    for row in res:
+        photo = Photo(*row)
+        if photo.exported:
+            hash = photo.content_hash()
+            if hash == ledger.exported_hash(photo.pk):
+                # only the metadata changed
+                ledger.record(photo.pk, photo.modified, hash)
+                continue
+        yield photo
+
+def upload_photos(photos, ledger, output_folder, cache=None):
+    total = 0
+    converted = []
 
     for photo in tqdm(photos):
-        photo.copy_to_output(output)
+        total += 1
+        photo.copy_to_output(output_folder, cache)
         if photo.copied_to_output:
-            count += 1
+            converted.append(photo)
 
-    print("{} of {} photo(s) processed.".format(count, len(photos)))
+    print("{} of {} photo(s) processed.".format(len(converted), total))
 
     print("exporting file to device...")
-    for photo in photos:
-        photo.push_to_device(cur, conn)
+    with Device() as device:
+        for photo in converted:
+            photo.push_to_device(
+                device, functools.partial(photo.mark_exported, ledger))
+
+def upload_photos_pipelined(photos, ledger, staged, output_folder, cache=None):
+    """
+    Converts photos into `output_folder` on this thread while a worker thread
+    pushes the converted ones to the device. At most `staged` converted files
+    are in the output folder at any time; each one is removed once it is on
+    the device.
+    """
+    slots = threading.Semaphore(staged)
+    converted = queue.Queue()
+    exported = queue.Queue()
+    failure = []
+
+    def pushed(photo):
+        photo.remove_output()
+        exported.put(photo)
+        slots.release()
+
+    def push_worker():
+        try:
+            with Device(batch_size=staged) as device:
+                while True:
+                    photo = converted.get()
+                    if photo is None:
+                        break
+                    photo.push_to_device(device, functools.partial(pushed, photo))
+                    # don't let the device idle while the next photo converts
+                    if converted.empty():
+                        device.flush()
+        except Exception as e:
+            failure.append(e)
+            # unblock the converter so it can stop
+            slots.release(staged)
+
+    def record_exported():
+        # the database connection belongs to this thread
+        while not exported.empty():
+            exported.get().mark_exported(ledger)
+
+    worker = threading.Thread(target=push_worker)
+    worker.start()
+    count = 0
+    total = 0
+
+    try:
+        for photo in tqdm(photos):
+            total += 1
+            slots.acquire()
+            if failure:
+                break
+            photo.copy_to_output(output_folder, cache)
+            if photo.copied_to_output:
+                count += 1
+                converted.put(photo)
+            else:
+                slots.release()
+            record_exported()
+    finally:
+        converted.put(None)
+        worker.join()
+        record_exported()
+
+    if failure:
+        raise failure[0]
+
+    print("{} of {} photo(s) processed and exported.".format(count, total))
 
 if __name__ == "__main__":
-    import sys
+    parser = argparse.ArgumentParser(description="Sync new photos to an Android device.")
+    parser.add_argument("--album", nargs="?", const=True,
+                        help="list the albums, and upload the album with this id if given")
+    parser.add_argument("--pipeline", type=int, metavar="N",
+                        help="push while converting, keeping at most N files in out/")
+    parser.add_argument("--full", action="store_true",
+                        help="consider the whole library, not just what changed since the last sync")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always convert Live Photos instead of reusing cached outputs")
+    args = parser.parse_args()
+
     p = path('/database/Photos.sqlite')
     print(p)
     conn = sqlite3.connect(p)
-    cur = setup_connection(conn)
+    cur = conn.cursor()
 
     output = "out/"
+    cache = None if args.no_cache else ConversionCache(version=motion_photo.CONVERTER_VERSION)
 
     if not os.path.exists(output):
         os.mkdir(output)
 
+    def upload(photos, ledger):
+        if args.pipeline:
+            upload_photos_pipelined(photos, ledger, args.pipeline, output, cache)
+        else:
+            upload_photos(photos, ledger, output, cache)
 
-    if ('--album' in sys.argv):
-        get_albums_to_upload(cur)
+    with ExportLedger(conn) as ledger:
+        if args.album:
+            get_albums_to_upload(cur)
 
-        if len(sys.argv) > 2:
-            album_id = sys.argv[2]
-            photos = get_photos_to_upload_for_album(cur, album_id)
+            if args.album is not True:
+                photos = get_photos_to_upload_for_album(cur, args.album)
 
-            upload_photos(photos)
+                upload(photos, ledger)
 
-        exit(0)
+            exit(0)
 
-    else:
-        photos = get_photos_to_upload(cur)
-        upload_photos(photos)
+        else:
+            mark = ledger.library_mark()
+            photos = get_photos_to_upload(cur, ledger, not args.full)
+            upload(photos, ledger)
+            ledger.set_high_water_mark(*mark)
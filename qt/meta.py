@@ -1,39 +1,111 @@
 from isobmff.BoundedBuffer import BoundedBuffer
 from isobmff.Box import Box, FullAtom
 from isobmff.BoxList import BoxList
+from isobmff.Layout import Layout
+
+def fixed_16_16(value: int) -> int:
+    return value >> 16
 
 class MVHD(FullAtom):
     type = b"mvhd"
+
+    TAIL = Layout(
+        ('preferred_rate', 'I'),
+        ('preferred_volume', 'H'),
+        ('reserved', '10s'),
+        ('matrix', '36s'),
+        ('preview_time', 'I'),
+        ('preview_duration', 'I'),
+        ('poster_time', 'I'),
+        ('selection_time', 'I'),
+        ('selection_duration', 'I'),
+        ('current_time', 'I'),
+        ('next_track_id', 'I'))
+
+    LAYOUTS = {
+        0: Layout(('creation_time', 'I'), ('modification_time', 'I'), ('time_scale', 'I'), ('duration', 'I')) + TAIL,
+        1: Layout(('creation_time', 'Q'), ('modification_time', 'Q'), ('time_scale', 'I'), ('duration', 'Q')) + TAIL,
+    }
     
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, MVHD.type)
-        self.creation_time = self.buffer.read_int32_be()
-        self.modification_time = self.buffer.read_int32_be()
-        self.time_scale = self.buffer.read_int32_be()
-        self.duration = self.buffer.read_int32_be()
-        self.preferred_rate = self.buffer.read_int32_be()
-        self.preferred_volume = self.buffer.read_int16_be()
-        self.reserved = self.buffer.read(10)
-        self.matrix = self.buffer.read(36)
-        self.preview_time = self.buffer.read_int32_be()
-        self.preview_duration = self.buffer.read_int32_be()
-        self.poster_time = self.buffer.read_int32_be()
-        self.selection_time = self.buffer.read_int32_be()
-        self.selection_duration = self.buffer.read_int32_be()
-        self.current_time = self.buffer.read_int32_be()
-        self.next_track_id = self.buffer.read_int32_be()
+
+    def read_payload(self):
+        self.seek_to_content()
+        MVHD.LAYOUTS[1 if self.version == 1 else 0].read_into(self, self.buffer)
+
+    def duration_us(self) -> int:
+        """
+        The duration in microseconds, or None if the header has no time scale.
+        """
+        if not self.time_scale:
+            return None
+        return (self.duration * 1000000 + self.time_scale // 2) // self.time_scale
+
+class TKHD(FullAtom):
+    type = b"tkhd"
+
+    TAIL = Layout(
+        ('reserved_1', '8s'),
+        ('layer', 'H'),
+        ('alternate_group', 'H'),
+        ('volume', 'H'),
+        ('reserved_2', 'H'),
+        ('matrix', '36s'),
+        ('width', 'I', fixed_16_16),
+        ('height', 'I', fixed_16_16))
+
+    LAYOUTS = {
+        0: Layout(('creation_time', 'I'), ('modification_time', 'I'), ('track_id', 'I'), ('reserved', 'I'), ('duration', 'I')) + TAIL,
+        1: Layout(('creation_time', 'Q'), ('modification_time', 'Q'), ('track_id', 'I'), ('reserved', 'I'), ('duration', 'Q')) + TAIL,
+    }
+
+    def __init__(self, buffer: BoundedBuffer, offset: int):
+        super().__init__(buffer, offset, TKHD.type)
+
+    def read_payload(self):
+        self.seek_to_content()
+        TKHD.LAYOUTS[1 if self.version == 1 else 0].read_into(self, self.buffer)
+
+class TRAK(Box):
+    type = b'trak'
+
+    specialised = {TKHD.type: TKHD}
+
+    def __init__(self, buffer: BoundedBuffer, offset: int):
+        super().__init__(buffer, offset, TRAK.type)
+
+    def read_payload(self):
+        self._entries = BoxList(self.contents(), 0, TRAK.specialised)
+
+    @property
+    def tkhd(self) -> TKHD:
+        self.load()
+        return self._entries.find(TKHD.type)
+
+    def __iter__(self):
+        self.load()
+        return self._entries.__iter__()
 
 class MOOV(Box):
     type = b'moov'
+
+    specialised = {MVHD.type: MVHD, TRAK.type: TRAK}
+
     def __init__(self, buffer: BoundedBuffer, offset: int):
         super().__init__(buffer, offset, MOOV.type)
-        self._read_entries()
-
-    def _read_entries(self):
-        self._entries = []
-        for atom in BoxList(self.contents(), 0):
-            if atom.type == b'mvhd':
-                self.mvhd = atom.cast_to(MVHD)
-                self._entries.append(self.mvhd)
-            else:
-                self._entries.append(atom)
+
+    def read_payload(self):
+        self._entries = BoxList(self.contents(), 0, MOOV.specialised)
+
+    @property
+    def mvhd(self) -> MVHD:
+        self.load()
+        return self._entries.find(MVHD.type)
+
+    def tracks(self):
+        return [atom for atom in self if atom.type == TRAK.type]
+
+    def __iter__(self):
+        self.load()
+        return self._entries.__iter__()
@@ -0,0 +1,72 @@
+from isobmff.AsyncMediaFile import AsyncMediaFile
+from qt.QuickTimeFile import QuickTimeFile
+from qt.meta import MOOV
+
+
+class Track(object):
+    def __init__(self, id: int, duration: int, width: int, height: int):
+        self.id = id
+        self.duration = duration
+        self.width = width
+        self.height = height
+
+    def __repr__(self):
+        return "<Track id=%d duration=%d %dx%d>" % (self.id, self.duration, self.width, self.height)
+
+
+class Probe(object):
+    """
+    Summary of a QuickTime movie taken from the `moov` header alone. No
+    sample data is read or decoded.
+    """
+
+    def __init__(self, path: str, size: int, time_scale: int, duration: int, duration_us: int, tracks: list):
+        self.path = path
+        self.size = size
+        self.time_scale = time_scale
+        self.duration = duration
+        self.duration_us = duration_us
+        self.tracks = tracks
+
+    def track_count(self):
+        return len(self.tracks)
+
+    def dimensions(self):
+        """
+        Width and height of the first track with a picture, or None for movies
+        without video.
+        """
+        for track in self.tracks:
+            if track.width and track.height:
+                return (track.width, track.height)
+
+    def __repr__(self):
+        return "<Probe %s size=%d duration_us=%r tracks=%r>" % (self.path, self.size, self.duration_us, self.tracks)
+
+
+def probe(path: str) -> Probe:
+    with QuickTimeFile(path, use_mmap=True) as f:
+        return _summarise(path, f.size, f.moov)
+
+
+async def probe_async(path: str) -> Probe:
+    """
+    `probe` for asyncio callers, reading only the top-level box headers and
+    `moov` through awaitable I/O.
+    """
+    async with AsyncMediaFile(path, QuickTimeFile) as f:
+        return _summarise(path, f.size, await f.find(MOOV.type))
+
+
+def _summarise(path: str, size: int, moov: MOOV) -> Probe:
+    if not moov or not moov.mvhd:
+        raise Exception("No movie header in %s" % path)
+
+    tracks = []
+    for trak in moov.tracks():
+        tkhd = trak.tkhd
+        if tkhd:
+            tracks.append(Track(tkhd.track_id, tkhd.duration, tkhd.width, tkhd.height))
+
+    mvhd = moov.mvhd
+    return Probe(path, size, mvhd.time_scale, mvhd.duration, mvhd.duration_us(), tracks)
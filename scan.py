@@ -0,0 +1,128 @@
+"""
+Dumps the structure of every HEIF and QuickTime file under the given folders
+as JSON Lines, for auditing a camera dump before it is ingested.
+
+Each line describes one file: its box tree, the `infe` entries of its item
+table and its `mvhd` header, i.e. what `list_meta.py` and `meta2.py` print
+for a single file. Files are parsed by worker processes and written in the
+order they were found, as soon as each is done, so only a bounded number of
+results is held in memory however large the folder is.
+
+Usage:
+
+python3 ./scan.py [--jobs N] /path/to/photos '/path/to/**/*.mov' [...] > scan.jsonl
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from isobmff.Box import Box
+from isobmff.BoxList import BoxList
+from isobmff.MediaFile import MediaFile
+from heif.meta import META
+from qt.meta import MOOV
+from media_index import walk
+from parallel import bounded_map, cpu_count, positive_int
+
+# boxes made of nothing but other boxes, which the tree descends into.
+CONTAINERS = (b'moov', b'trak', b'mdia', b'minf', b'stbl', b'dinf', b'edts',
+              b'mvex', b'moof', b'traf', b'iprp', b'ipco', b'meta')
+
+
+class ScanFile(MediaFile):
+    specialised = {META.type: META, MOOV.type: MOOV}
+
+
+def expand(patterns):
+    """
+    Yields the files named by `patterns`, which may be files, folders (whose
+    photos and movies are listed recursively) or glob patterns.
+    """
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        for p in glob.iglob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]:
+            if os.path.isdir(p):
+                yield from walk(p)
+            else:
+                yield p
+
+
+def children(box: Box):
+    if isinstance(box, (META, MOOV)):
+        return box
+    # a QuickTime `meta` is a plain box, unlike the one of HEIF files, so
+    # only top-level ones are known to hold boxes.
+    if box.type in CONTAINERS and box.type != META.type:
+        return BoxList(box.contents(), 0)
+    return ()
+
+
+def box_tree(box: Box) -> dict:
+    node = {
+        "type": box.type.decode('ascii', 'replace'),
+        "offset": box.buffer.offs(box.offset),
+        "size": box.size,
+    }
+    boxes = [box_tree(child) for child in children(box)]
+    if boxes:
+        node["boxes"] = boxes
+    return node
+
+
+def dump(path: str) -> dict:
+    result = {"path": path, "size": os.stat(path).st_size}
+    try:
+        with ScanFile(path, use_mmap=True) as f:
+            result["boxes"] = [box_tree(box) for box in f.items]
+
+            meta = f.find(META.type)
+            if meta and meta.iinf:
+                result["infe"] = [{"id": infe.id, "reserved": infe.reserved, "inf": infe.inf, "mime": infe.mime}
+                                  for infe in meta.iinf]
+
+            moov = f.find(MOOV.type)
+            if moov and moov.mvhd:
+                mvhd = moov.mvhd
+                result["mvhd"] = {
+                    "version": mvhd.version,
+                    "creation_time": mvhd.creation_time,
+                    "modification_time": mvhd.modification_time,
+                    "time_scale": mvhd.time_scale,
+                    "duration": mvhd.duration,
+                    "duration_us": mvhd.duration_us(),
+                    "next_track_id": mvhd.next_track_id,
+                }
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+
+
+def scan(patterns, out=sys.stdout, jobs=1):
+    """
+    Writes one JSON line per file named by `patterns` to `out`. Returns the
+    number of files that could not be parsed.
+    """
+    failed = 0
+    for (path, result, error) in bounded_map(dump, expand(patterns), jobs):
+        if error:
+            result = {"path": path, "error": "%s: %s" % (type(error).__name__, error)}
+        if "error" in result:
+            failed += 1
+        out.write(json.dumps(result))
+        out.write("\n")
+        out.flush()
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump the box structure of photos and movies as JSON Lines.")
+    parser.add_argument("path", nargs="+",
+                        help="files, folders or glob patterns to scan")
+    parser.add_argument("--jobs", "-j", type=positive_int, default=cpu_count(),
+                        help="number of worker processes, one per core by default")
+    args = parser.parse_args()
+
+    if scan(args.path, jobs=args.jobs):
+        exit(1)
@@ -0,0 +1,147 @@
+"""
+Builders for small, synthetic HEIF and QuickTime files. They hold no real
+image or sample data, only enough box structure for the parsers.
+"""
+
+import os
+import stat
+import struct
+import tempfile
+from unittest import mock
+from heif.content import XMP_MIME
+
+
+def box(type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I', 8 + len(payload)) + type + payload
+
+
+def full_atom(type: bytes, version: int, flags: int, payload: bytes) -> bytes:
+    return box(type, struct.pack('>I', (version << 24) | flags) + payload)
+
+
+def infe(id: int, inf: bytes, mime: bytes = None) -> bytes:
+    payload = struct.pack('>HH', id, 0) + inf + b'\0'
+    if mime:
+        payload += mime + b'\0'
+    return full_atom(b'infe', 2, 0, payload)
+
+
+XMP = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/">'
+       b'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+       b'<rdf:Description rdf:about=""/></rdf:RDF></x:xmpmeta>')
+
+
+def heic(sizes=(100, 110, 120), xmp: bytes = None, xmp_located=True, to_end=False) -> bytes:
+    """
+    A HEIF file with one `hvc1` item of each size in `sizes`, filled with a
+    distinct byte per item, and an XMP item if `xmp` is given. The XMP item
+    has no `iloc` entry unless `xmp_located`.
+    """
+    payloads = [bytes([0x41 + i]) * size for (i, size) in enumerate(sizes)]
+    items = [(i + 1, b'hvc1', None) for i in range(len(sizes))]
+    if xmp is not None:
+        items.append((len(items) + 1, b'mime', XMP_MIME.encode('utf-8')))
+        if xmp_located:
+            payloads.append(xmp)
+
+    ftyp = box(b'ftyp', b'heic\0\0\0\0mif1heic')
+
+    def build(offsets):
+        iinf = full_atom(b'iinf', 0, 0, struct.pack('>H', len(items)) +
+                         b''.join(infe(*item) for item in items))
+        rows = b''.join(struct.pack('>HHHHII', id, 0, 0, 1, offset, len(payload))
+                        for ((id, _, _), offset, payload) in zip(items, offsets, payloads))
+        iloc = full_atom(b'iloc', 1, 0, struct.pack('>HH', 0x4400, len(payloads)) + rows)
+        hdlr = full_atom(b'hdlr', 0, 0, b'\0' * 4 + b'pict' + b'\0' * 13)
+        pitm = full_atom(b'pitm', 0, 0, struct.pack('>H', 1))
+        return full_atom(b'meta', 0, 0, hdlr + pitm + iloc + iinf)
+
+    offsets = []
+    position = len(ftyp) + len(build([0] * len(payloads))) + 8
+    for payload in payloads:
+        offsets.append(position)
+        position += len(payload)
+
+    data = b''.join(payloads)
+    mdat = struct.pack('>I', 0) + b'mdat' + data if to_end else box(b'mdat', data)
+    return ftyp + build(offsets) + mdat
+
+
+def mvhd(version=0, time_scale=600, duration=1800) -> bytes:
+    times = struct.pack('>QQIQ' if version else '>IIII', 1, 2, time_scale, duration)
+    tail = struct.pack('>IH', 0x10000, 0x100) + b'\0' * 46 + struct.pack('>7I', 0, 0, 0, 0, 0, 0, 3)
+    return full_atom(b'mvhd', version, 0, times + tail)
+
+
+def tkhd(track_id: int, width: int, height: int) -> bytes:
+    return full_atom(b'tkhd', 0, 3, struct.pack('>IIIII', 1, 2, track_id, 0, 1800) + b'\0' * 16 +
+                     b'\0' * 36 + struct.pack('>II', width << 16, height << 16))
+
+
+def mov(version=0, time_scale=600, duration=1800, mdat_size=5000) -> bytes:
+    ftyp = box(b'ftyp', b'qt  \0\0\0\0qt  ')
+    mdat = box(b'mdat', b'\x11' * mdat_size)
+    moov = box(b'moov', mvhd(version, time_scale, duration) +
+               box(b'trak', tkhd(1, 1920, 1080)) + box(b'trak', tkhd(2, 0, 0)))
+    return ftyp + mdat + moov
+
+
+class TemporaryFiles(object):
+    """
+    Mixin for test cases writing files into a temporary folder.
+    """
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+# logs every adb invocation, and every command run through `adb shell`
+# with `am` standing in for the activity manager. With STAGED_DIR set,
+# pushes also log how many files that folder holds.
+FAKE_ADB = """#!/bin/sh
+log="$(dirname "$0")/adb.log"
+echo "adb $*" >> "$log"
+if [ "$1" = "push" ] && [ -n "$STAGED_DIR" ]; then
+  echo "staged $(ls "$STAGED_DIR" | wc -l)" >> "$log"
+fi
+if [ "$1" = "shell" ] && [ $# -eq 1 ]; then
+  am() { echo "am $*" >> "$log"; }
+  while IFS= read -r line; do eval "$line"; done
+fi
+"""
+
+
+class FakeAdb(TemporaryFiles):
+    """
+    Mixin for test cases running adb, which is replaced by `FAKE_ADB`
+    through the `ADB` environment variable.
+    """
+
+    def setUp(self):
+        super().setUp()
+        adb = self.write('adb', FAKE_ADB.encode('utf-8'))
+        os.chmod(adb, os.stat(adb).st_mode | stat.S_IXUSR)
+        patcher = mock.patch.dict(os.environ, {"ADB": adb})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def adb_log(self) -> list:
+        """
+        The logged commands after the shell session was started. The session
+        starts in the background, so it may log after the first push.
+        """
+        with open(os.path.join(self.tmp, 'adb.log')) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines.count("adb shell"), 1)
+        lines.remove("adb shell")
+        return lines
@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+from heif.HeifFile import HeifFile
+from isobmff.AsyncMediaFile import AsyncMediaFile
+from isobmff.SparseSource import Unbuffered
+from qt.probe import probe, probe_async
+from tests.fixtures import TemporaryFiles, heic, mov
+
+
+def summary(p) -> tuple:
+    return (p.size, p.time_scale, p.duration, p.duration_us,
+            [(t.id, t.duration, t.width, t.height) for t in p.tracks])
+
+
+class AsyncMediaFileTest(TemporaryFiles, unittest.TestCase):
+    def test_probe_async_matches_probe(self):
+        for version in (0, 1):
+            path = self.write('movie.mov', mov(version, time_scale=90000, duration=270000))
+            self.assertEqual(summary(asyncio.run(probe_async(path))), summary(probe(path)))
+
+    def test_concurrent_probes(self):
+        paths = [self.write('movie%d.mov' % i, mov(duration=600 * (i + 1))) for i in range(20)]
+
+        async def probe_all():
+            return await asyncio.gather(*[probe_async(path) for path in paths])
+
+        durations = [p.duration_us for p in asyncio.run(probe_all())]
+        self.assertEqual(durations, [1000000 * (i + 1) for i in range(20)])
+
+    def test_skipped_boxes_are_listed_but_not_read(self):
+        path = self.write('movie.mov', mov(mdat_size=100000))
+
+        async def load():
+            async with AsyncMediaFile(path) as f:
+                media = await f.load()
+                mdat = media.find(b'mdat')
+                self.assertEqual([box.type for box in media.items], [b'ftyp', b'mdat', b'moov'])
+                self.assertEqual(mdat.size, 100008)
+                contents = mdat.contents()
+                contents.seek(0)
+                with self.assertRaises(Unbuffered):
+                    contents.read(8)
+                # only the headers of skipped boxes are fetched
+                self.assertLess(sum(len(part) for part in f._source._parts), 1000)
+
+        asyncio.run(load())
+
+    def test_heif_items(self):
+        path = self.write('photo.heic', heic(to_end=True))
+
+        async def load():
+            async with AsyncMediaFile(path, HeifFile, skip=()) as f:
+                media = await f.load()
+                items = []
+                for chunk in media.content.chunks:
+                    chunk.buffer.seek(0)
+                    items.append(chunk.buffer.read(3))
+                return items
+
+        self.assertEqual(asyncio.run(load()), [b'AAA', b'BBB', b'CCC'])
+
+
+if __name__ == '__main__':
+    unittest.main()
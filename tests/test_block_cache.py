@@ -0,0 +1,115 @@
+import io
+import unittest
+from unittest import mock
+import isobmff.MediaFile
+from isobmff.BlockCache import BlockCache
+from heif.HeifFile import HeifFile
+from qt.QuickTimeFile import QuickTimeFile
+from tests.fixtures import TemporaryFiles, heic, mov
+
+
+class CountingFile(io.BytesIO):
+    """
+    In-memory file counting the reads that reach it.
+    """
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+class BlockCacheTest(unittest.TestCase):
+    BLOCK = BlockCache.BLOCK_SIZE
+
+    def setUp(self):
+        self.data = bytes(i % 251 for i in range(self.BLOCK * 4 + 100))
+        self.file = CountingFile(self.data)
+        self.cache = BlockCache(self.file, self.BLOCK, blocks=2)
+
+    def read(self, offset: int, size: int) -> bytes:
+        self.cache.seek(offset)
+        data = self.cache.read(size)
+        self.assertEqual(data, self.data[offset:offset + size])
+        self.assertEqual(self.cache.tell(), offset + len(data))
+        return data
+
+    def test_hits_and_misses(self):
+        self.read(0, 8)
+        self.read(100, 8)
+        self.read(self.BLOCK - 8, 8)
+        self.assertEqual(self.file.reads, 1)
+
+        # spans two blocks
+        self.read(self.BLOCK - 4, 8)
+        self.assertEqual(self.file.reads, 2)
+
+    def test_evicts_least_recently_used(self):
+        self.read(0, 8)
+        self.read(self.BLOCK, 8)
+        self.read(0, 8)
+        self.read(self.BLOCK * 2, 8)
+        self.assertEqual(self.file.reads, 3)
+
+        # block 1 was evicted, block 0 was kept
+        self.read(8, 8)
+        self.assertEqual(self.file.reads, 3)
+        self.read(self.BLOCK + 8, 8)
+        self.assertEqual(self.file.reads, 4)
+
+    def test_large_reads_bypass_the_cache(self):
+        self.read(10, self.BLOCK + 1)
+        self.read(10, self.BLOCK + 1)
+        self.assertEqual(self.file.reads, 2)
+        self.assertEqual(len(self.cache._cache), 0)
+
+    def test_short_read_at_the_end(self):
+        self.assertEqual(self.read(len(self.data) - 4, 8), self.data[-4:])
+        self.assertEqual(self.read(len(self.data) + 10, 8), b'')
+
+    def test_block_size_must_be_page_aligned(self):
+        with self.assertRaises(ValueError):
+            BlockCache(self.file, 1000)
+
+
+class MediaFileReadsTest(TemporaryFiles, unittest.TestCase):
+    def parse(self, path: str, media, cache_blocks: int, walk) -> int:
+        """
+        Number of reads on the file while `walk` parses it.
+        """
+        opened = []
+
+        def open_counting(path, mode):
+            with open(path, 'rb') as f:
+                opened.append(CountingFile(f.read()))
+            return opened[-1]
+
+        with mock.patch.object(isobmff.MediaFile, 'open', open_counting, create=True):
+            with media(path, cache_blocks=cache_blocks) as f:
+                walk(f)
+        return opened[0].reads
+
+    def test_headers_are_read_in_one_block(self):
+        def walk_heif(f):
+            f.content
+            for chunk in f.content.chunks:
+                chunk.buffer.seek(0)
+                chunk.buffer.read(1)
+
+        def walk_movie(f):
+            [(trak.tkhd.width, trak.tkhd.height) for trak in f.moov.tracks()]
+            f.moov.mvhd.duration_us()
+
+        for (data, media, walk) in ((heic(), HeifFile, walk_heif), (mov(), QuickTimeFile, walk_movie)):
+            path = self.write('file', data)
+            uncached = self.parse(path, media, 0, walk)
+            cached = self.parse(path, media, BlockCache.BLOCKS, walk)
+            self.assertEqual(cached, 1)
+            self.assertGreater(uncached, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import io
+import struct
+import unittest
+from isobmff.AsyncMediaFile import AsyncMediaFile
+from isobmff.Box import Box, InvalidSize, PayloadError
+from isobmff.BoxList import BoxList
+from isobmff.MediaFile import MediaFile
+from isobmff.SparseSource import SparseSource
+from tests.fixtures import TemporaryFiles, box
+
+PAYLOAD = bytes(range(40))
+MDAT = b'\x11' * 300
+
+
+def large_box(type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4sQ', 1, type, 16 + len(payload)) + payload
+
+
+def nested(free=box) -> bytes:
+    return box(b'moov', box(b'udta', free(b'free', PAYLOAD))) + box(b'mdat', MDAT)
+
+
+def find(f: MediaFile, *path: bytes) -> Box:
+    found = f.find(path[0])
+    for type in path[1:]:
+        found = BoxList(found.contents(), 0).find(type)
+    return found
+
+
+class BoxTest(TemporaryFiles, unittest.TestCase):
+    def edit(self, data: bytes, pos: int, size: int, content: bytes) -> str:
+        """
+        Replaces `size` bytes at `pos` of the contents of the `free` box
+        nested in `data`, and saves the result.
+        """
+        src = self.write('src.mp4', data)
+        dest = self.tmp + '/dest.mp4'
+        with MediaFile(src) as f:
+            free = find(f, b'moov', b'udta', b'free')
+            free.contents().replace(pos, size, content)
+            self.assertEqual(free.edited_size(), free.size + len(content) - size)
+            f.save_as(dest)
+        return dest
+
+    def assertSaved(self, dest: str, payload: bytes, header_size=8):
+        with MediaFile(dest) as f:
+            moov = f.find(b'moov')
+            udta = find(f, b'moov', b'udta')
+            free = find(f, b'moov', b'udta', b'free')
+            self.assertEqual(free.header_size, header_size)
+            self.assertEqual(free.size, header_size + len(payload))
+            self.assertEqual(udta.size, 8 + free.size)
+            self.assertEqual(moov.size, 8 + udta.size)
+
+            free.contents().seek(0)
+            self.assertEqual(free.contents().read(len(payload)), payload)
+            mdat = f.find(b'mdat')
+            self.assertEqual(mdat.offset, moov.size)
+            mdat.contents().seek(0)
+            self.assertEqual(mdat.contents().read(len(MDAT)), MDAT)
+
+    def test_grows_nested_box(self):
+        dest = self.edit(nested(), 10, 0, b'\xff' * 100)
+        self.assertSaved(dest, PAYLOAD[:10] + b'\xff' * 100 + PAYLOAD[10:])
+
+    def test_shrinks_nested_box(self):
+        dest = self.edit(nested(), 5, 30, b'')
+        self.assertSaved(dest, PAYLOAD[:5] + PAYLOAD[35:])
+
+    def test_resizes_box_with_large_header(self):
+        dest = self.edit(nested(large_box), 0, 40, b'\xee' * 3)
+        self.assertSaved(dest, b'\xee' * 3, header_size=16)
+
+    def test_save_as_without_edits(self):
+        data = nested()
+        src = self.write('src.mp4', data)
+        dest = self.tmp + '/dest.mp4'
+        with MediaFile(src) as f:
+            f.save_as(dest)
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_reports_parser_errors(self):
+        class Broken(Box):
+            def read_payload(self):
+                self.field = self.missing
+
+        with MediaFile(self.write('src.mp4', nested())) as f:
+            moov = f.find(b'moov').cast_to(Broken)
+            with self.assertRaises(PayloadError) as raised:
+                moov.field
+            self.assertIsInstance(raised.exception.__cause__, AttributeError)
+            # attributes that are simply not there still aren't.
+            self.assertFalse(hasattr(moov, 'other'))
+
+    def test_rejects_boxes_smaller_than_their_header(self):
+        ftyp = box(b'ftyp', b'isom\0\0\0\0isom')
+        for bad in (struct.pack('>I4sQ', 1, b'free', 0), struct.pack('>I4sQ', 1, b'free', 15),
+                    struct.pack('>I4s', 4, b'free')):
+            data = ftyp + bad + box(b'mdat', MDAT)
+            with self.subTest(bad=bad):
+                with MediaFile.from_bytes(data) as f:
+                    with self.assertRaises(InvalidSize):
+                        list(f.items)
+                with self.assertRaises(InvalidSize):
+                    MediaFile.from_stream(io.BytesIO(data))
+
+                async def load():
+                    async with AsyncMediaFile(self.write('bad.mp4', data)) as f:
+                        await f.load()
+                with self.assertRaises(InvalidSize):
+                    asyncio.run(load())
+
+    def test_widens_headers_past_32_bits(self):
+        # only the headers are kept, so nothing beyond them can be read.
+        source = SparseSource()
+        source.add(0, struct.pack('>I4sI4s', 0xfffffff0, b'moov', 0xffffffe8, b'free'))
+        source.size = 0xfffffff0
+
+        with MediaFile(None, source=source) as f:
+            free = find(f, b'moov', b'free')
+            contents = free.contents()
+            contents.seek(0)
+            contents.write(0, b'x' * 0x20)
+
+            self.assertEqual(f.size, 0xfffffff0 + 0x20 + 16)
+            self.assertEqual(list(f.segments()), [
+                struct.pack('>I4sQ', 1, b'moov', 0x100000020) +
+                struct.pack('>I4sQ', 1, b'free', 0x100000010) + b'x' * 0x20,
+                (16, 0xffffffe0),
+            ])
+
+            # shrinking back keeps the widened headers.
+            contents.seek(0)
+            contents.write(0x20, b'')
+            self.assertEqual(list(f.segments()), [
+                struct.pack('>I4sQ', 1, b'moov', 0x100000000) +
+                struct.pack('>I4sQ', 1, b'free', 0xfffffff0),
+                (16, 0xffffffe0),
+            ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import struct
+import unittest
+from heif.HeifFile import HeifFile
+from heif.content import XMP_MIME, PointerChunk, XMPChunk
+from tests.fixtures import XMP, TemporaryFiles, heic
+
+
+class ContentTest(TemporaryFiles, unittest.TestCase):
+    def starts(self, heif: HeifFile) -> dict:
+        return dict((entry.id, (entry.content_start, entry.content_size))
+                    for entry in heif.meta.iloc.entries())
+
+    def test_chunk_at_extent_boundaries(self):
+        with HeifFile(self.write('a.heic', heic((100, 50), xmp=XMP))) as heif:
+            content = heif.content
+            starts = self.starts(heif)
+            (first, _) = starts[1]
+            (last, size) = starts[3]
+            expected = {0: None, content.offset: None, first - 1: None, first: 1, first + 99: 1,
+                        first + 100: 2, first + 149: 2, first + 150: 3, last + size - 1: 3,
+                        last + size: None}
+            for (offset, id) in expected.items():
+                with self.subTest(offset=offset):
+                    chunk = content.chunk_at(offset)
+                    self.assertEqual(chunk.id if chunk else None, id)
+            self.assertIsInstance(content.chunk_at(last), XMPChunk)
+
+    def test_chunk_at_gaps(self):
+        data = heic((100, 50))
+        path = self.write('a.heic', data)
+        with HeifFile(path) as heif:
+            (start, size) = self.starts(heif)[1]
+        # shrink the first item, leaving its last 40 bytes to no item.
+        row = struct.pack('>HHHHII', 1, 0, 0, 1, start, size)
+        self.assertEqual(data.count(row), 1)
+        path = self.write('gap.heic', data.replace(row, struct.pack('>HHHHII', 1, 0, 0, 1, start, 60)))
+
+        with HeifFile(path) as heif:
+            content = heif.content
+            self.assertEqual(content.chunk_at(start + 59).id, 1)
+            self.assertIsNone(content.chunk_at(start + 60))
+            self.assertIsNone(content.chunk_at(start + 99))
+            self.assertEqual(content.chunk_at(start + 100).id, 2)
+
+    def test_chunk_at_items_outside_mdat(self):
+        # an item pointing in front of mdat has no bytes of its own.
+        data = heic((100, 50))
+        path = self.write('a.heic', data)
+        with HeifFile(path) as heif:
+            (start, size) = self.starts(heif)[2]
+        row = struct.pack('>HHHHII', 2, 0, 0, 1, start, size)
+        path = self.write('outside.heic', data.replace(row, struct.pack('>HHHHII', 2, 0, 0, 1, 0, 8)))
+
+        with HeifFile(path) as heif:
+            self.assertIsInstance(heif.content.chunk_at(0), PointerChunk)
+            self.assertIsNone(heif.content.chunk_at(start))
+
+    def test_chunks_with_mime(self):
+        with HeifFile(self.write('a.heic', heic((100, 50), xmp=XMP))) as heif:
+            chunks = heif.content.chunks_with_mime(XMP_MIME)
+            self.assertEqual([chunk.id for chunk in chunks], [3])
+            self.assertIsInstance(chunks[0], XMPChunk)
+            self.assertEqual(chunks[0].raw(), XMP)
+            # coded images are not `mime` items.
+            self.assertEqual(heif.content.chunks_with_mime('image/heic'), [])
+
+        with HeifFile(self.write('b.heic', heic((100, 50)))) as heif:
+            self.assertEqual(heif.content.chunks_with_mime(XMP_MIME), [])
+
+        # an XMP item without an `iloc` entry has no chunk.
+        with HeifFile(self.write('c.heic', heic((100, 50), xmp=XMP, xmp_located=False))) as heif:
+            self.assertEqual(heif.meta.iinf.ids_with_mime(XMP_MIME), [3])
+            self.assertEqual(heif.content.chunks_with_mime(XMP_MIME), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
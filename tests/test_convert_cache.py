@@ -0,0 +1,84 @@
+import os
+import unittest
+from unittest import mock
+import convert_cache
+from convert_cache import ConversionCache, fingerprint_files
+from tests.fixtures import TemporaryFiles
+
+
+class FingerprintTest(TemporaryFiles, unittest.TestCase):
+    def test_frames_each_file(self):
+        a = self.write('a', b'AB')
+        b = self.write('b', b'C')
+        c = self.write('c', b'A')
+        d = self.write('d', b'BC')
+        self.assertNotEqual(fingerprint_files([a, b]), fingerprint_files([c, d]))
+
+    def test_covers_size_head_and_tail(self):
+        size = convert_cache.SAMPLE_SIZE * 4
+        data = bytearray(size)
+        path = self.write('movie', data)
+        keys = set([fingerprint_files([path])])
+
+        for change in (0, size - 1):
+            edited = bytearray(data)
+            edited[change] = 1
+            keys.add(fingerprint_files([self.write('movie', edited)]))
+        keys.add(fingerprint_files([self.write('movie', data + b'\0')]))
+
+        self.assertEqual(len(keys), 4)
+
+    def test_salt(self):
+        path = self.write('a', b'data')
+        self.assertNotEqual(fingerprint_files([path], b'1'), fingerprint_files([path], b'2'))
+
+
+class ConversionCacheTest(TemporaryFiles, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = ConversionCache(self.tmp + '/cache', max_bytes=250)
+        self.builds = 0
+
+    def build(self, data):
+        def build(path):
+            self.builds += 1
+            with open(path, 'wb') as f:
+                f.write(data)
+        return build
+
+    def test_builds_once(self):
+        for name in ('one', 'two'):
+            self.cache.fetch_or_build('key', self.tmp + '/' + name, self.build(b'x' * 10))
+        self.assertEqual(self.builds, 1)
+        with open(self.tmp + '/two', 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 10)
+
+    def test_outputs_are_not_linked_to_entries(self):
+        dest = self.tmp + '/out'
+        self.cache.fetch_or_build('key', dest, self.build(b'x' * 10))
+        self.assertNotEqual(os.stat(dest).st_ino, os.stat(self.cache._path('key')).st_ino)
+
+        # as a later run without the cache rewrites the same output name.
+        with open(dest, 'wb') as f:
+            f.write(b'y' * 10)
+        with open(self.cache._path('key'), 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 10)
+
+    def test_evicts_least_recently_used_when_full(self):
+        with mock.patch.object(ConversionCache, 'evict', autospec=True,
+                               side_effect=ConversionCache.evict) as evict:
+            for i in range(5):
+                self.cache.fetch_or_build('key%d' % i, self.tmp + '/out', self.build(b'x' * 100))
+                os.utime(self.cache._path('key%d' % i), (i, i))
+
+            # once to learn the size of the cache, then whenever it is full,
+            # trimming it to 3/4 of the limit
+            self.assertEqual(evict.call_count, 3)
+
+        self.assertEqual(sorted(os.listdir(self.tmp + '/cache')), ['key4'])
+        self.assertFalse(self.cache.fetch('key0', self.tmp + '/out'))
+        self.assertTrue(self.cache.fetch('key4', self.tmp + '/out'))
+
+
+if __name__ == '__main__':
+    unittest.main()
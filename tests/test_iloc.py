@@ -0,0 +1,156 @@
+import io
+import itertools
+import struct
+import unittest
+from heif.meta import ILOC
+from isobmff.MediaFile import MediaFile
+from tests.fixtures import full_atom
+
+FORMATS = {0: '', 4: 'I', 8: 'Q'}
+
+
+def iloc(version: int, items: list, offset_size=4, length_size=4, base_size=0, index_size=0, tail=b'') -> bytes:
+    """
+    An `iloc` box holding `items`, each `(id, method, dref, base, extents)`
+    with `extents` a list of `(index, offset, length)`.
+    """
+    reserved = (offset_size << 12) | (length_size << 8) | (base_size << 4) | index_size
+    table = struct.pack('>HI' if version == 2 else '>HH', reserved, len(items))
+    for (id, method, dref, base, extents) in items:
+        table += struct.pack('>I' if version == 2 else '>H', id)
+        if version > 0:
+            table += struct.pack('>H', method)
+        table += struct.pack('>H' + FORMATS[base_size], dref, *([base] if base_size else []))
+        table += struct.pack('>H', len(extents))
+        for extent in extents:
+            fields = [(size, n) for (size, n) in zip((index_size, offset_size, length_size), extent) if size]
+            table += struct.pack('>' + ''.join(FORMATS[size] for (size, _) in fields), *(n for (_, n) in fields))
+    return full_atom(b'iloc', version, 0, table + tail)
+
+
+def parse(data: bytes) -> ILOC:
+    f = MediaFile.from_bytes(data)
+    f.__enter__()
+    return ILOC(f, 0).load()
+
+
+def decoded(box: ILOC) -> list:
+    return [(entry.id, entry.construction_method, entry.data_reference_index, entry.base_offset,
+             [tuple(extent) for extent in entry.extents()])
+            for entry in box.entries()]
+
+
+class ILOCTest(unittest.TestCase):
+    def items(self, version, offset_size, length_size, base_size, index_size) -> list:
+        def value(size, n):
+            # large enough to need all of a 64-bit field
+            return 0 if not size else n << 32 | n if size == 8 else n
+
+        def extent(n):
+            return (value(index_size, n), value(offset_size, 0x100 + n), value(length_size, 0x10 + n))
+
+        return [
+            (1, 0, 0, value(base_size, 0x1000), [extent(1)]),
+            (2, 1 if version else 0, 0, value(base_size, 0x2000), [extent(2), extent(3), extent(4)]),
+            (0x7fff, 0, 1, 0, []),
+            (3, 0, 0, value(base_size, 0x3000), [extent(5)]),
+        ]
+
+    def test_versions_and_widths(self):
+        for version in (0, 1, 2):
+            for (offset_size, length_size, base_size) in itertools.product((0, 4, 8), repeat=3):
+                for index_size in (0, 4, 8) if version else (0,):
+                    sizes = (offset_size, length_size, base_size, index_size)
+                    with self.subTest(version=version, sizes=sizes):
+                        items = self.items(version, *sizes)
+                        box = parse(iloc(version, items, *sizes))
+                        self.assertEqual(box.count, len(items))
+                        self.assertEqual(decoded(box), items)
+
+    def test_uniform_table(self):
+        items = [(id, 0, 0, 0, [(0, 0x100 * id, 0x10)]) for id in range(1, 200)]
+        box = parse(iloc(1, items))
+        self.assertEqual(decoded(box), items)
+        self.assertEqual(box.entries()[5].content_start, 0x600)
+
+    def test_table_of_uniform_size_with_other_counts(self):
+        # two items with two and no extents take as many bytes as two items
+        # with one each.
+        items = [(1, 0, 0, 0, [(0, 0x100, 1), (0, 0x200, 2)]), (2, 0, 0, 0, [])]
+        self.assertEqual(len(iloc(1, items)), len(iloc(1, [(1, 0, 0, 0, [(0, 0, 0)])] * 2)))
+        self.assertEqual(decoded(parse(iloc(1, items))), items)
+
+    def test_rejects_trailing_bytes(self):
+        items = [(1, 0, 0, 0, [(0, 0x100, 1), (0, 0x200, 2)])]
+        with self.assertRaises(Exception):
+            parse(iloc(1, items, tail=b'\0\0'))
+
+    def test_rejects_truncated_table(self):
+        data = iloc(1, [(1, 0, 0, 0, [(0, 0x100, 1), (0, 0x200, 2)])])
+        with self.assertRaises(Exception):
+            parse(struct.pack('>I', len(data) - 4) + data[4:-4])
+
+    def test_rejects_counts_beyond_the_box(self):
+        data = iloc(2, [(1, 0, 0, 0, [(0, 0x100, 1)])])
+        data = data[:14] + struct.pack('>I', 0xffffffff) + data[18:]
+        with self.assertRaises(Exception):
+            parse(data)
+
+    def test_relocates_every_extent(self):
+        items = [(1, 0, 0, 0, [(0, 0x100, 0x10), (0, 0x300, 0x10)]),
+                 (2, 0, 0, 0x200, [(0, 0x10, 0x10), (0, 0x20, 0x10)]),
+                 (3, 0, 1, 0, [(0, 0x400, 0x10)])]
+        box = parse(iloc(1, items, base_size=4))
+        self.assertEqual(box.relocate(0x200, 0x50), 2)
+
+        out = io.BytesIO()
+        box.buffer.commit(out)
+        self.assertEqual(decoded(parse(out.getvalue())), [
+            (1, 0, 0, 0, [(0, 0x100, 0x10), (0, 0x350, 0x10)]),
+            (2, 0, 0, 0x250, [(0, 0x10, 0x10), (0, 0x20, 0x10)]),
+            (3, 0, 1, 0, [(0, 0x400, 0x10)]),
+        ])
+
+    def test_refuses_to_move_extents_without_offsets(self):
+        items = [(1, 0, 0, 0, [(0, 0, 0x10)]), (2, 0, 0, 0x200, [(0, 0, 0x10)])]
+        box = parse(iloc(1, items, offset_size=0, base_size=4))
+        # moving the base offset moves the extent along with it.
+        self.assertEqual(box.relocate(0x100, 0x50), 1)
+        self.assertEqual(box.relocate(0, 0x50), 2)
+
+        # without base offsets either, extents are at the start of the file.
+        box = parse(iloc(1, items[:1], offset_size=0))
+        self.assertEqual(box.relocate(1, 0x50), 0)
+        with self.assertRaises(Exception):
+            box.relocate(0, 0x50)
+
+    def test_item_at(self):
+        items = [(1, 0, 0, 0, [(0, 0x100, 0x10), (0, 0x180, 0x10)]),
+                 (2, 0, 0, 0x200, [(0, 0x10, 0x20)]),
+                 # in `idat` and in another file, so never found.
+                 (3, 1, 0, 0, [(0, 0x150, 0x10)]),
+                 (4, 0, 1, 0, [(0, 0x300, 0x10)])]
+        box = parse(iloc(1, items, base_size=4))
+        expected = {0: None, 0xff: None, 0x100: 1, 0x10f: 1, 0x110: None, 0x150: None,
+                    0x17f: None, 0x180: 1, 0x18f: 1, 0x190: None, 0x20f: None,
+                    0x210: 2, 0x22f: 2, 0x230: None, 0x300: None}
+        for (offset, id) in expected.items():
+            with self.subTest(offset=hex(offset)):
+                item = box.item_at(offset)
+                self.assertEqual(item.id if item else None, id)
+
+        # the lookup follows a relocation.
+        box.relocate(0x180, 0x40)
+        self.assertIsNone(box.item_at(0x180))
+        self.assertEqual(box.item_at(0x1c0).id, 1)
+        self.assertEqual(box.item_at(0x250).id, 2)
+
+    def test_item_at_skips_empty_extents(self):
+        items = [(1, 0, 0, 0, [(0, 0x100, 0)]), (2, 0, 0, 0, [(0, 0x100, 0x10)]), (3, 0, 0, 0, [(0, 0x110, 0)])]
+        box = parse(iloc(1, items))
+        self.assertEqual(box.item_at(0x100).id, 2)
+        self.assertIsNone(box.item_at(0x110))
+
+
+if __name__ == '__main__':
+    unittest.main()
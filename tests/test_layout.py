@@ -0,0 +1,42 @@
+import io
+import struct
+import unittest
+from isobmff.BoundedBuffer import BoundedBuffer
+from isobmff.Layout import Layout, uint
+
+
+class Target(object):
+    pass
+
+
+class LayoutTest(unittest.TestCase):
+    LAYOUT = Layout(('version', 'B'), ('flags', '3s', uint), ('id', 'H'))
+
+    def test_unpack(self):
+        self.assertEqual(self.LAYOUT.size, 6)
+        self.assertEqual(self.LAYOUT.unpack(b'\0\1\x02\x03\x00\x2a'), (0, 0x010203, 42))
+        self.assertEqual(self.LAYOUT.unpack(b'xx\x02\0\0\1\0\7', 2), (2, 1, 7))
+
+    def test_concatenation_and_offsets(self):
+        layout = self.LAYOUT + Layout(('size', 'Q'))
+        self.assertEqual(layout.names, ['version', 'flags', 'id', 'size'])
+        self.assertEqual([layout.offset(name) for name in layout.names], [0, 1, 4, 6])
+        self.assertEqual(layout.unpack(layout.pack(1, b'\0\0\2', 3, 1 << 40)), (1, 2, 3, 1 << 40))
+
+    def test_columns(self):
+        layout = Layout(('id', 'H'), ('offset', 'I'))
+        table = b''.join(struct.pack('>HI', id, id * 100) for id in range(1, 5))
+        self.assertEqual(layout.iter_unpack(table), {'id': (1, 2, 3, 4), 'offset': (100, 200, 300, 400)})
+        self.assertEqual(layout.iter_unpack(b''), {'id': (), 'offset': ()})
+
+    def test_read_into(self):
+        buffer = BoundedBuffer(io.BytesIO(b'\xff\x01\0\0\2\0\3'), 1, 6)
+        buffer.seek(0)
+        target = Target()
+        self.LAYOUT.read_into(target, buffer)
+        self.assertEqual((target.version, target.flags, target.id), (1, 2, 3))
+        self.assertEqual(buffer.current_position(), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+from list_meta import IINF, ISOBMFF
+from tests.fixtures import TemporaryFiles, XMP, heic
+
+
+class ListMetaTest(TemporaryFiles, unittest.TestCase):
+    def test_old_attributes(self):
+        with ISOBMFF(self.write('a.heic', heic((100, 50), xmp=XMP))) as f:
+            iinf = f.box("meta").child(4).find("iinf").cast(IINF)
+            entries = iinf.entries()
+
+            self.assertEqual((iinf.type, iinf.size), ("iinf", 3))
+            self.assertEqual(iinf.box_size, 14 + sum(infe.size for infe in entries))
+            self.assertEqual([(infe.id, infe.type, infe.subtype) for infe in entries],
+                             [(1, "hvc1", None), (2, "hvc1", None), (3, "mime", "application/rdf+xml")])
+            self.assertEqual(set(infe.box_type for infe in entries), {"infe"})
+            self.assertEqual(repr(entries[2]), "< infe v2 flags=000000 0x0003 0x0000 mime 'application/rdf+xml' >")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import io
+import os
+import threading
+import unittest
+import zipfile
+from heif.HeifFile import HeifFile
+from heif.content import XMP_MIME
+from isobmff.BoundedBuffer import BoundedBuffer
+from isobmff.BoxList import BoxList
+from isobmff.MediaFile import MediaFile
+from isobmff.SparseSource import SparseSource, Unbuffered
+from tests.fixtures import XMP, TemporaryFiles, box, heic
+
+DATA = box(b'free', bytes(range(100))) + box(b'skip', b'\x22' * 50)
+
+
+def tree(heif: HeifFile) -> list:
+    """
+    The top-level boxes, the boxes in `meta` and the items it declares,
+    all of which a stream keeps.
+    """
+    return ([(b.type, b.offset, b.size) for b in heif.items] +
+            [(b.type, b.offset, b.size) for b in BoxList(heif.meta.contents(), 0)] +
+            [(e.id, e.content_start, e.content_size) for e in heif.meta.iloc.entries()] +
+            [heif.meta.iinf.ids_with_mime(XMP_MIME)])
+
+
+def piped(data: bytes):
+    """
+    A pipe that `data` is written to from another thread.
+    """
+    (r, w) = os.pipe()
+
+    def feed():
+        with os.fdopen(w, 'wb') as f:
+            f.write(data)
+
+    threading.Thread(target=feed).start()
+    return os.fdopen(r, 'rb')
+
+
+class MediaFileTest(TemporaryFiles, unittest.TestCase):
+    def test_mapped_reads_are_views(self):
+        with MediaFile(self.write('a.mp4', DATA), use_mmap=True) as f:
+            f.seek(8)
+            data = f.read(10)
+            self.assertIsInstance(data, memoryview)
+            self.assertEqual(data, bytes(range(10)))
+
+    def test_unmapped_reads_are_bytes(self):
+        with MediaFile(self.write('a.mp4', DATA)) as f:
+            f.seek(8)
+            self.assertEqual(f.read(10), bytes(range(10)))
+
+    def test_closes_with_views_still_held(self):
+        with MediaFile(self.write('a.mp4', DATA), use_mmap=True) as f:
+            contents = f.find(b'free').contents()
+            contents.seek(0)
+            held = [contents.read(4)]
+
+            # a child later replaced by an edit, whose view is no longer
+            # reachable through the spans.
+            child = BoundedBuffer(contents, 20, 10)
+            child.seek(0)
+            held.append(child.read(4))
+            contents.replace(0, 40, b'')
+            held.append(child._view)
+
+        # closing released every view instead of failing to unmap.
+        self.assertIsNone(f._mmap)
+        for view in held:
+            with self.assertRaises(ValueError):
+                view.tobytes()
+
+
+class MemoryAndStreamTest(TemporaryFiles, unittest.TestCase):
+    def expected(self, data: bytes) -> list:
+        with HeifFile(self.write('a.heic', data)) as heif:
+            return tree(heif)
+
+    def xmp(self, heif: HeifFile) -> bytes:
+        return heif.content.chunks_with_mime(XMP_MIME)[0].raw()
+
+    def test_from_bytes(self):
+        for to_end in (False, True):
+            data = heic((100, 50), xmp=XMP, to_end=to_end)
+            expected = self.expected(data)
+            # a view that starts part way into its buffer.
+            view = memoryview(bytearray(b'junk' + data))[4:]
+            for source in (data, bytearray(data), view):
+                with self.subTest(to_end=to_end, source=type(source)):
+                    with HeifFile.from_bytes(source) as heif:
+                        self.assertEqual(tree(heif), expected)
+                        self.assertEqual(self.xmp(heif), XMP)
+
+    def test_from_stream(self):
+        for to_end in (False, True):
+            data = heic((100, 50), xmp=XMP, to_end=to_end)
+            expected = self.expected(data)
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+                z.writestr('a.heic', data)
+
+            for (name, stream) in (('pipe', lambda: piped(data)),
+                                   ('zip', lambda: zipfile.ZipFile(archive).open('a.heic'))):
+                with self.subTest(to_end=to_end, stream=name):
+                    with stream() as f, HeifFile.from_stream(f) as heif:
+                        self.assertEqual(tree(heif), expected)
+                        self.assertEqual(heif.size, len(data))
+                        # mdat was skipped, so only its header is kept.
+                        mdat = heif.find(b'mdat')
+                        with self.assertRaises(Unbuffered):
+                            mdat.contents().seek(0)
+                            mdat.contents().read(1)
+                        with self.assertRaises(Unbuffered):
+                            self.xmp(heif)
+
+                    # keeping every box makes the contents readable.
+                    with stream() as f, HeifFile.from_stream(f, skip=()) as heif:
+                        self.assertEqual(tree(heif), expected)
+                        self.assertEqual(self.xmp(heif), XMP)
+
+    def test_read_boxes(self):
+        data = heic((100, 50), xmp=XMP)
+        with piped(data) as f:
+            source = SparseSource.read_boxes(f, skip=(b'mdat',))
+        self.assertEqual(source.size, len(data))
+        mdat = data.index(b'mdat') - 4
+        # everything up to the payload of mdat was kept, and nothing after.
+        source.seek(0)
+        self.assertEqual(source.read(mdat + 8), data[:mdat + 8])
+        with self.assertRaises(Unbuffered):
+            source.seek(mdat + 8)
+            source.read(1)
+        with self.assertRaises(Unbuffered):
+            source.seek(mdat)
+            source.read(9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import unittest
+import media_index
+import motion_photo
+from media_index import MediaIndex
+from tests.fixtures import TemporaryFiles, heic, mov
+
+
+class MediaIndexTest(TemporaryFiles, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.mkdir(self.tmp + '/photos')
+        os.mkdir(self.tmp + '/photos/__working__')
+        self.write('photos/a.heic', heic())
+        self.write('photos/a.mov', mov())
+        self.index = MediaIndex(self.tmp + '/index.sqlite')
+
+    def tearDown(self):
+        self.index.close()
+        super().tearDown()
+
+    def test_update_parses_changed_files_only(self):
+        root = self.tmp + '/photos'
+        self.assertEqual(self.index.update(root), 2)
+        self.assertEqual(self.index.update(root), 0)
+
+        movie = self.write('photos/a.mov', mov(duration=2400))
+        self.assertEqual(self.index.update(root), 1)
+        self.assertEqual(self.index.cached(movie).duration_us, 4000000)
+
+        os.remove(movie)
+        self.index.update(root)
+        self.assertIsNone(self.index.cached(movie))
+        self.assertIsNone(self.index._stored(movie))
+
+    def test_describes_headers(self):
+        photo = self.index.get(self.tmp + '/photos/a.heic')
+        self.assertEqual([box[0] for box in photo.boxes], ['ftyp', 'meta', 'mdat'])
+        self.assertEqual(photo.items, [(1, 'hvc1', None), (2, 'hvc1', None), (3, 'hvc1', None)])
+        self.assertFalse(photo.has_xmp)
+
+        movie = self.index.get(self.tmp + '/photos/a.mov')
+        self.assertEqual((movie.time_scale, movie.duration, movie.tracks), (600, 1800, 2))
+        self.assertEqual((movie.width, movie.height), (1920, 1080))
+
+    def test_reuses_converted_output(self):
+        d = self.tmp + '/photos/'
+        wd = d + '__working__/'
+
+        (mp_file, entry, reused) = motion_photo.convert_or_reuse(('a.heic', None), d, wd)
+        self.assertFalse(reused)
+        self.assertTrue(entry.motion_photo)
+        self.index.record(entry)
+
+        (_, _, reused) = motion_photo.convert_or_reuse(('a.heic', self.index.cached(mp_file)), d, wd)
+        self.assertTrue(reused)
+
+        # a movie changed after the output was written is converted again
+        stat = os.stat(mp_file)
+        os.utime(d + 'a.mov', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        (_, _, reused) = motion_photo.convert_or_reuse(('a.heic', self.index.cached(mp_file)), d, wd)
+        self.assertFalse(reused)
+
+    def test_reuses_output_in_relative_folder(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        try:
+            (mp_file, entry, reused) = motion_photo.convert_or_reuse(('a.heic', None), 'photos/', 'photos/__working__/')
+            self.assertEqual(entry.path, self.tmp + '/photos/__working__/a.heic')
+            self.index.record(entry)
+
+            cached = self.index.cached(mp_file)
+            self.assertIsNotNone(cached)
+            (_, _, reused) = motion_photo.convert_or_reuse(('a.heic', cached), 'photos/', 'photos/__working__/')
+            self.assertTrue(reused)
+
+            # update() keeps the output's row until the output is deleted.
+            self.index.update('photos')
+            self.assertIsNotNone(self.index.cached(mp_file))
+            os.remove(mp_file)
+            self.index.update('photos')
+            self.assertIsNone(self.index._stored(os.path.abspath(mp_file)))
+        finally:
+            os.chdir(cwd)
+
+    def test_does_not_reuse_other_files(self):
+        d = self.tmp + '/photos/'
+        wd = d + '__working__/'
+        self.write('photos/__working__/a.heic', heic())
+
+        (_, entry, reused) = motion_photo.convert_or_reuse(('a.heic', None), d, wd)
+        self.assertFalse(reused)
+        self.assertTrue(entry.motion_photo)
+        self.assertEqual(media_index.describe(wd + 'a.heic').motion_photo, True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import argparse
+import contextlib
+import io
+import unittest
+from parallel import bounded_map, positive_int
+
+
+def invert(n: int) -> float:
+    return 1 / n
+
+
+class ParallelTest(unittest.TestCase):
+    def test_results_in_order(self):
+        for jobs in (1, 3):
+            results = list(bounded_map(invert, [1, 2, 0, 4], jobs, in_flight=2))
+            self.assertEqual([(item, result) for (item, result, _) in results],
+                             [(1, 1.0), (2, 0.5), (0, None), (4, 0.25)])
+            self.assertIsInstance(results[2][2], ZeroDivisionError)
+
+    def test_rejects_jobs_below_one(self):
+        for jobs in (0, -1):
+            with self.assertRaises(ValueError):
+                list(bounded_map(invert, [1], jobs))
+
+    def test_jobs_argument(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--jobs", type=positive_int, default=1)
+        self.assertEqual(parser.parse_args(["--jobs", "4"]).jobs, 4)
+        for value in ("0", "-2", "x"):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                parser.parse_args(["--jobs", value])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import unittest
+from unittest import mock
+import photo_sync
+from photo_sync import ExportLedger, get_photos_to_upload, upload_photos_pipelined
+from tests.fixtures import FakeAdb, TemporaryFiles, heic, mov
+
+
+class PhotoLibrary(TemporaryFiles):
+    """
+    Mixin for test cases running against a minimal Photos library with
+    four assets, of which the even ones are Live Photos.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.library = self.tmp + '/Photos Library.photoslibrary'
+        os.makedirs(self.library + '/database')
+        patcher = mock.patch.object(photo_sync, 'PHOTO_LIB_DIR', self.library)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.conn = sqlite3.connect(self.library + '/database/Photos.sqlite')
+        self.conn.executescript("""
+        CREATE TABLE ZAsset (Z_PK integer primary key, ZKindSubtype integer, ZFilename text,
+                             ZUUID text, ZMODIFICATIONDATE real);
+        CREATE TABLE ZAdditionalAssetAttributes (Z_PK integer primary key, ZAsset integer,
+                                                 ZOriginalFilename text);
+        """)
+        for pk in range(1, 5):
+            self.add_asset(pk)
+
+        self.ledger = ExportLedger(self.conn, self.tmp + '/ledger.sqlite')
+        self.addCleanup(self.conn.close)
+
+    def add_asset(self, pk: int):
+        uuid = '%d000000%d-UUID' % (pk, pk)
+        live = pk % 2 == 0
+        folder = self.library + '/originals/' + uuid[0]
+        os.makedirs(folder, exist_ok=True)
+        with open(folder + '/' + uuid + '.heic', 'wb') as f:
+            f.write(heic())
+        if live:
+            with open(folder + '/' + uuid + '_3.mov', 'wb') as f:
+                f.write(mov())
+        with self.conn:
+            self.conn.execute("INSERT INTO ZAsset VALUES (?, ?, ?, ?, ?)",
+                              (pk, 2 if live else 0, uuid + '.heic', uuid, 1000.0 + pk))
+            self.conn.execute("INSERT INTO ZAdditionalAssetAttributes VALUES (?, ?, ?)",
+                              (pk, pk, 'IMG_%04d.HEIC' % pk))
+
+    def sync(self) -> list:
+        mark = self.ledger.library_mark()
+        photos = list(get_photos_to_upload(self.conn.cursor(), self.ledger))
+        for photo in photos:
+            photo.mark_exported(self.ledger)
+        self.ledger.set_high_water_mark(*mark)
+        return sorted(photo.pk for photo in photos)
+
+
+class IncrementalSyncTest(PhotoLibrary, unittest.TestCase):
+    def test_only_new_and_changed_assets_are_exported(self):
+        self.assertEqual(self.sync(), [1, 2, 3, 4])
+        self.assertEqual(self.sync(), [])
+
+        self.add_asset(5)
+        self.assertEqual(self.sync(), [5])
+
+        # a metadata-only edit is recorded without exporting the photo again
+        with self.conn:
+            self.conn.execute("UPDATE ZAsset SET ZMODIFICATIONDATE = 2000 WHERE Z_PK = 2")
+        self.assertEqual(self.sync(), [])
+
+        # an edit that rewrote the movie is exported again
+        movie = self.library + '/originals/4/40000004-UUID_3.mov'
+        stat = os.stat(movie)
+        os.utime(movie, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        with self.conn:
+            self.conn.execute("UPDATE ZAsset SET ZMODIFICATIONDATE = 2001 WHERE Z_PK = 4")
+        self.assertEqual(self.sync(), [4])
+
+
+class PipelinedUploadTest(FakeAdb, PhotoLibrary, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.out = self.tmp + '/out/'
+        os.makedirs(self.out)
+        for patcher in (mock.patch.object(photo_sync.Photo, 'filenames', {}),
+                        mock.patch.dict(os.environ, {"STAGED_DIR": self.out})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_pushes_in_order_with_bounded_staging(self):
+        photos = list(get_photos_to_upload(self.conn.cursor(), self.ledger))
+        upload_photos_pipelined(photos, self.ledger, 2, self.out)
+
+        log = self.adb_log()
+        pushes = [line.split()[2:-1] for line in log if line.startswith("adb push")]
+        self.assertEqual([os.path.basename(path) for paths in pushes for path in paths],
+                         [photo.filename for photo in photos])
+        staged = [int(line.split()[1]) for line in log if line.startswith("staged")]
+        self.assertEqual(len(staged), len(pushes))
+        self.assertTrue(all(0 < n <= 2 for n in staged), staged)
+
+        # every pushed file was removed, and recorded as exported.
+        self.assertEqual(os.listdir(self.out), [])
+        self.ledger.flush()
+        self.assertEqual(self.sync(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+from qt.probe import probe
+from tests.fixtures import TemporaryFiles, mov
+
+
+class ProbeTest(TemporaryFiles, unittest.TestCase):
+    def test_duration(self):
+        for version in (0, 1):
+            result = probe(self.write('movie.mov', mov(version, time_scale=600, duration=1801)))
+            self.assertEqual((result.time_scale, result.duration, result.duration_us), (600, 1801, 3001667))
+            self.assertEqual(result.dimensions(), (1920, 1080))
+
+    def test_movie_without_time_scale(self):
+        result = probe(self.write('movie.mov', mov(time_scale=0)))
+        self.assertIsNone(result.duration_us)
+        self.assertIn("duration_us=None", repr(result))
+
+
+if __name__ == '__main__':
+    unittest.main()
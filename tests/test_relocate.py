@@ -0,0 +1,60 @@
+import unittest
+from heif.HeifFile import HeifFile
+from tests.fixtures import TemporaryFiles, heic
+
+
+class RelocateTest(TemporaryFiles, unittest.TestCase):
+    SIZES = (100, 110, 120)
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.write('src.heic', heic(self.SIZES))
+        with HeifFile(self.path) as heif:
+            self.starts = [entry.content_start for entry in heif.meta.iloc.entries()]
+
+    def items(self, path: str) -> list:
+        with open(path, 'rb') as f:
+            data = f.read()
+        with HeifFile(path) as heif:
+            return [data[entry.content_start:entry.content_start + entry.content_size]
+                    for entry in heif.meta.iloc.entries()]
+
+    def resize_hdlr(self, delta: int, use_mmap: bool):
+        dest = self.tmp + '/dest.heic'
+        with HeifFile(self.path, use_mmap=use_mmap) as heif:
+            hdlr = heif.meta.find_child(b'hdlr').contents()
+            if delta < 0:
+                hdlr.replace(hdlr.size + delta, -delta, b'')
+            else:
+                hdlr.replace(hdlr.size, 0, b'\0' * delta)
+
+            # boxes behind the edit, not loaded before it, are still read
+            # from the source.
+            self.assertEqual([infe.id for infe in heif.meta.iinf], [1, 2, 3])
+            self.assertEqual([entry.content_start for entry in heif.meta.iloc.entries()],
+                             [start + delta for start in self.starts])
+            heif.save_as(dest)
+        return dest
+
+    def test_shrinking_before_iloc_is_loaded(self):
+        for use_mmap in (False, True):
+            dest = self.resize_hdlr(-5, use_mmap)
+            self.assertEqual(self.items(dest), self.items(self.path))
+
+    def test_growing_before_iloc_is_loaded(self):
+        for use_mmap in (False, True):
+            dest = self.resize_hdlr(7, use_mmap)
+            self.assertEqual(self.items(dest), self.items(self.path))
+
+    def test_offsets_must_fit_their_fields(self):
+        with HeifFile(self.path) as heif:
+            iloc = heif.meta.iloc
+            with self.assertRaises(Exception):
+                iloc.relocate(0, 1 << 32)
+            with self.assertRaises(Exception):
+                iloc.relocate(0, -self.starts[0] - 1)
+            self.assertEqual([entry.content_start for entry in iloc.entries()], self.starts)
+
+
+if __name__ == '__main__':
+    unittest.main()
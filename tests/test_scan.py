@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import struct
+import unittest
+import scan
+from tests.fixtures import TemporaryFiles, XMP, box, heic, mov
+
+# a `free` box whose 64-bit size is 0, which used to be read over and over
+# at the same offset.
+CORRUPT = box(b'ftyp', b'heic\0\0\0\0mif1heic') + struct.pack('>I4sQ', 1, b'free', 0) + box(b'mdat', b'')
+
+
+def tree(boxes: list) -> list:
+    return [(b["type"], tree(b.get("boxes", []))) for b in boxes]
+
+
+class ScanTest(TemporaryFiles, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(self.tmp + '/photos/2020')
+        os.mkdir(self.tmp + '/photos/__working__')
+        self.heif = self.write('photos/2020/IMG_0001.heic', heic((100, 50), xmp=XMP))
+        self.movie = self.write('photos/2020/IMG_0001.mov', mov())
+        self.corrupt = self.write('photos/IMG_0002.heic', CORRUPT)
+        self.write('photos/__working__/IMG_0001.heic', heic())
+        self.write('photos/notes.txt', b'not media')
+
+    def scan(self, patterns, jobs=1) -> list:
+        out = io.StringIO()
+        failed = scan.scan(patterns, out, jobs)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(failed, sum("error" in record for record in records))
+        return records
+
+    def test_dumps_heif(self):
+        record = scan.dump(self.heif)
+        self.assertEqual(record["size"], os.path.getsize(self.heif))
+        self.assertEqual(tree(record["boxes"]), [
+            ("ftyp", []), ("meta", [("hdlr", []), ("pitm", []), ("iloc", []), ("iinf", [])]), ("mdat", [])])
+        self.assertEqual(record["boxes"][1]["offset"], 24)
+        self.assertEqual(record["infe"], [
+            {"id": 1, "reserved": 0, "inf": "hvc1", "mime": None},
+            {"id": 2, "reserved": 0, "inf": "hvc1", "mime": None},
+            {"id": 3, "reserved": 0, "inf": "mime", "mime": "application/rdf+xml"},
+        ])
+        self.assertNotIn("mvhd", record)
+
+    def test_dumps_movie(self):
+        record = scan.dump(self.movie)
+        self.assertEqual(tree(record["boxes"]), [
+            ("ftyp", []), ("mdat", []), ("moov", [("mvhd", []), ("trak", [("tkhd", [])]), ("trak", [("tkhd", [])])])])
+        self.assertEqual(record["mvhd"], {
+            "version": 0, "creation_time": 1, "modification_time": 2, "time_scale": 600,
+            "duration": 1800, "duration_us": 3000000, "next_track_id": 3})
+        self.assertNotIn("infe", record)
+
+    def test_scans_folders_in_order(self):
+        for jobs in (1, 2):
+            records = self.scan([self.tmp + '/photos'], jobs)
+            # files before subfolders; working folders and other files are
+            # skipped.
+            self.assertEqual([record["path"] for record in records], [self.corrupt, self.heif, self.movie])
+            self.assertEqual(records[1], scan.dump(self.heif))
+            self.assertEqual(records[2], scan.dump(self.movie))
+
+    def test_expands_patterns(self):
+        records = self.scan([self.tmp + '/photos/**/*.mov', self.corrupt, self.tmp + '/missing.heic'])
+        self.assertEqual([record["path"] for record in records],
+                         [self.movie, self.corrupt, self.tmp + '/missing.heic'])
+        self.assertTrue(records[2]["error"].startswith("FileNotFoundError: "))
+
+    def test_reports_malformed_boxes(self):
+        out = io.StringIO()
+        self.assertEqual(scan.scan([self.corrupt, self.heif], out), 1)
+
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record["path"] for record in records], [self.corrupt, self.heif])
+        self.assertEqual(set(records[0]), {"path", "size", "error"})
+        self.assertTrue(records[0]["error"].startswith("InvalidSize: "))
+        self.assertNotIn("error", records[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
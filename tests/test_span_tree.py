@@ -0,0 +1,91 @@
+import io
+import random
+import unittest
+from isobmff.BoundedBuffer import BoundedBuffer, UnownedBuffer
+
+
+def render(buffer: BoundedBuffer, data: bytes) -> bytes:
+    return b''.join(data[s[0]:s[0] + s[1]] if type(s) == tuple else s
+                    for s in buffer.segments())
+
+
+class SpanTreeTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.data = bytes(rng.randrange(256) for _ in range(5000))
+
+    def buffer(self) -> BoundedBuffer:
+        return BoundedBuffer(io.BytesIO(self.data), 0, len(self.data), False)
+
+    def test_random_edits_match_a_bytearray(self):
+        rng = random.Random(2)
+        for trial in range(200):
+            buffer = self.buffer()
+            expected = bytearray(self.data)
+            # the original offset of every byte still in `expected`, or None
+            # for inserted ones.
+            origins = list(range(len(self.data)))
+            for _ in range(30):
+                pos = rng.randrange(len(expected) + 1)
+                size = rng.choice((0, rng.randrange(min(50, len(expected) - pos) + 1)))
+                content = bytes(rng.randrange(256) for _ in range(rng.randrange(40)))
+
+                buffer.seek(pos)
+                buffer.write(size, content)
+                expected[pos:pos + size] = content
+                origins[pos:pos + size] = [None] * len(content)
+
+                self.assertEqual(buffer.size, len(expected))
+                self.assertEqual(len(buffer._spans) > 0, len(expected) > 0)
+
+            self.assertEqual(render(buffer, self.data), bytes(expected), trial)
+            for (pos, original) in enumerate(origins):
+                if original is not None:
+                    self.assertEqual(buffer._spans.translate(original), pos)
+                    self.assertEqual(buffer._spans.original(pos), original)
+
+    def test_children_move_with_edits(self):
+        buffer = self.buffer()
+        child = BoundedBuffer(buffer, 100, 200, False)
+        self.assertEqual(buffer.position_of(child), 100)
+
+        buffer.seek(0)
+        buffer.write(10, b'')
+        self.assertEqual(buffer.position_of(child), 90)
+
+        child.seek(5)
+        child.write(1, b'xyz')
+        self.assertEqual((child.size, buffer.size), (202, 4992))
+        self.assertEqual(buffer.position_of(child), 90)
+
+        buffer.seek(292)
+        buffer.write(0, b'after')
+        self.assertEqual(buffer.position_of(child), 90)
+        self.assertEqual(buffer._spans.translate(300), 297)
+
+        expected = bytearray(self.data)
+        expected[105:106] = b'xyz'
+        expected[302:302] = b'after'
+        self.assertEqual(render(buffer, self.data), bytes(expected[10:]))
+
+    def test_refuses_to_cut_a_child(self):
+        buffer = self.buffer()
+        child = BoundedBuffer(buffer, 100, 200, False)
+        for (pos, size) in ((95, 10), (150, 10), (295, 10)):
+            with self.assertRaises(UnownedBuffer):
+                buffer.seek(pos)
+                buffer.write(size, b'q')
+        self.assertEqual(buffer.size, len(self.data))
+        self.assertEqual(buffer.position_of(child), 100)
+        self.assertEqual(render(buffer, self.data), self.data)
+
+    def test_refuses_keys_out_of_order(self):
+        buffer = self.buffer()
+        with self.assertRaises(ValueError):
+            buffer._write(100, 0, b'x', 4000)
+        self.assertEqual(buffer._spans.translate(4000), 4000)
+        self.assertEqual(render(buffer, self.data), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
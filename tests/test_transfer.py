@@ -0,0 +1,46 @@
+import os
+import unittest
+from transfer import SCAN_DIRS, Device
+from tests.fixtures import FakeAdb
+
+
+class DeviceTest(FakeAdb, unittest.TestCase):
+    def broadcasts(self, *names) -> list:
+        return ["am broadcast -a android.intent.action.MEDIA_SCANNER_SCAN_FILE -d file://%s/%s" % (d, name)
+                for name in names for d in SCAN_DIRS]
+
+    def test_pushes_in_batches(self):
+        paths = [self.write('IMG_%04d.HEIC' % i, b'') for i in range(5)]
+        done = []
+
+        with Device(batch_size=2) as device:
+            for path in paths:
+                device.push(path, lambda path=path: done.append(path))
+            # the last file waits for the batch to fill up or the device
+            # to be closed.
+            self.assertEqual(done, paths[:4])
+        self.assertEqual(done, paths)
+
+        names = [os.path.basename(path) for path in paths]
+        self.assertEqual(self.adb_log(),
+                         ["adb push %s %s /sdcard/DCIM/Camera" % tuple(paths[0:2])] + self.broadcasts(*names[0:2]) +
+                         ["adb push %s %s /sdcard/DCIM/Camera" % tuple(paths[2:4])] + self.broadcasts(*names[2:4]) +
+                         ["adb push %s /sdcard/DCIM/Camera" % paths[4]] + self.broadcasts(names[4]))
+
+    def test_quotes_file_names(self):
+        path = self.write("it's here.HEIC", b'')
+        with Device() as device:
+            device.push(path)
+        self.assertEqual(self.adb_log()[1:], self.broadcasts("it's here.HEIC"))
+
+    def test_does_not_push_after_errors(self):
+        path = self.write('IMG_0001.HEIC', b'')
+        with self.assertRaises(KeyError):
+            with Device() as device:
+                device.push(path)
+                raise KeyError(path)
+        self.assertEqual(self.adb_log(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
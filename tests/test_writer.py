@@ -0,0 +1,101 @@
+import os
+import unittest
+from heif.HeifFile import HeifFile
+from heif.content import XMP_MIME
+from heif.writer import HeifWriter, inject_xmp
+from tests.fixtures import TemporaryFiles, XMP, heic
+
+
+class HeifWriterTest(TemporaryFiles, unittest.TestCase):
+    def items(self, path: str) -> dict:
+        """
+        The bytes of every item of the file at `path`, read through `iloc`.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        with HeifFile(path) as heif:
+            return dict((entry.id, data[entry.content_start:entry.content_start + entry.content_size])
+                        for entry in heif.meta.iloc.entries())
+
+    def xmp_ids(self, path: str) -> list:
+        with HeifFile(path) as heif:
+            return heif.meta.iinf.ids_with_mime(XMP_MIME)
+
+    def test_adds_xmp(self):
+        for sizes in ((100, 50), (100, 110, 120), (1,), (4000, 3, 70)):
+            src = self.write('src.heic', heic(sizes))
+            dest = self.tmp + '/dest.heic'
+            before = self.items(src)
+
+            inject_xmp(src, dest, XMP)
+
+            after = self.items(dest)
+            self.assertEqual(self.xmp_ids(dest), [len(sizes) + 1])
+            self.assertEqual(after.pop(len(sizes) + 1), XMP)
+            self.assertEqual(after, before)
+
+    def test_replaces_xmp(self):
+        src = self.write('src.heic', heic((100, 50), xmp=b'<old/>' * 20))
+        dest = self.tmp + '/dest.heic'
+        before = self.items(src)
+
+        inject_xmp(src, dest, XMP)
+
+        after = self.items(dest)
+        self.assertEqual(self.xmp_ids(dest), [3])
+        self.assertEqual(after.pop(3), XMP)
+        before.pop(3)
+        self.assertEqual(after, before)
+
+    def test_locates_xmp_item_without_iloc_entry(self):
+        src = self.write('src.heic', heic((100, 50), xmp=XMP, xmp_located=False))
+        dest = self.tmp + '/dest.heic'
+        before = self.items(src)
+
+        inject_xmp(src, dest, XMP)
+
+        after = self.items(dest)
+        self.assertEqual(self.xmp_ids(dest), [3])
+        self.assertEqual(after.pop(3), XMP)
+        self.assertEqual(after, before)
+
+    def test_appends_boxes(self):
+        src = self.write('src.heic', heic((100, 50)))
+        movie = self.write('movie.mov', b'\x22' * 300)
+        dest = self.tmp + '/dest.heic'
+
+        writer = HeifWriter(src)
+        writer.set_xmp(XMP)
+        writer.append_box(b'mpvd', movie)
+        writer.write(dest)
+
+        with HeifFile(dest) as heif:
+            mpvd = heif.find(b'mpvd')
+            self.assertEqual(mpvd.size, 308)
+            self.assertEqual(mpvd.contents().read(300), b'\x22' * 300)
+        self.assertEqual(self.items(dest)[3], XMP)
+
+    def test_keeps_dest_when_writing_fails(self):
+        src = self.write('src.heic', heic((100, 50)))
+        movie = self.write('movie.mov', b'\x22' * 300)
+        dest = self.write('dest.heic', b'earlier output')
+
+        writer = HeifWriter(src)
+        writer.set_xmp(XMP)
+        writer.append_box(b'mpvd', movie)
+        os.remove(movie)
+        with self.assertRaises(FileNotFoundError):
+            writer.write(dest)
+
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'earlier output')
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['dest.heic', 'src.heic'])
+
+    def test_refuses_to_write_in_place(self):
+        src = self.write('src.heic', heic())
+        with self.assertRaises(Exception):
+            inject_xmp(src, src, XMP)
+
+
+if __name__ == '__main__':
+    unittest.main()
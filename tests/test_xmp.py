@@ -0,0 +1,100 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from heif.HeifFile import MOTION_PHOTO_PROPERTIES, HeifFile
+from heif.content import XMP_MIME, XMPChunk
+from heif.writer import inject_xmp
+from motion_photo import MotionPhotoWriter
+from tests.fixtures import XMP, TemporaryFiles, heic, mov
+
+# a property held as a simple element rather than an attribute, under a
+# prefix that is declared only on that element.
+ELEMENT_XMP = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/">'
+               b'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+               b'<rdf:Description rdf:about="" xmlns:xmp="http://ns.adobe.com/xap/1.0/"'
+               b' xmp:CreatorTool="shortcuts">'
+               b'<dc:title xmlns:dc="http://purl.org/dc/elements/1.1/"> Holiday </dc:title>'
+               b'</rdf:Description></rdf:RDF></x:xmpmeta>')
+
+
+class XMPTest(TemporaryFiles, unittest.TestCase):
+    def motion_photo(self) -> str:
+        img = self.write('img.heic', heic((100, 50)))
+        movie = self.write('movie.mov', mov())
+        dest = self.tmp + '/dest.heic'
+        MotionPhotoWriter(img, movie).write(dest)
+        return dest
+
+    def xmp(self, heif: HeifFile) -> XMPChunk:
+        chunks = heif.content.chunks_with_mime(XMP_MIME)
+        self.assertEqual(len(chunks), 1)
+        self.assertIsInstance(chunks[0], XMPChunk)
+        return chunks[0]
+
+    def test_motion_photo_properties(self):
+        with HeifFile(self.motion_photo()) as heif:
+            chunk = self.xmp(heif)
+            self.assertEqual(chunk.properties(*MOTION_PHOTO_PROPERTIES), {
+                'GCamera:MotionPhoto': '1',
+                'GCamera:MotionPhotoVersion': '1',
+                'GCamera:MotionPhotoPresentationTimestampUs': '3000000',
+            })
+
+    def test_missing_properties(self):
+        with HeifFile(self.motion_photo()) as heif:
+            chunk = self.xmp(heif)
+            # a prefix the packet never declares, and a name it lacks under
+            # one that it does.
+            self.assertEqual(chunk.properties('GCamera:MotionPhoto', 'xmp:Rating', 'GCamera:Other'), {
+                'GCamera:MotionPhoto': '1',
+                'xmp:Rating': None,
+                'GCamera:Other': None,
+            })
+            # misses are cached along with the hits.
+            with mock.patch.object(XMPChunk, '_elements', side_effect=AssertionError):
+                self.assertEqual(chunk.properties('GCamera:Other', 'GCamera:MotionPhoto'),
+                                 {'GCamera:Other': None, 'GCamera:MotionPhoto': '1'})
+
+    def test_element_properties(self):
+        src = self.write('src.heic', heic((100, 50)))
+        dest = self.tmp + '/dest.heic'
+        inject_xmp(src, dest, ELEMENT_XMP)
+        for feed_size in (4096, 7):
+            with mock.patch.object(XMPChunk, 'FEED_SIZE', feed_size), HeifFile(dest) as heif:
+                with self.subTest(feed_size=feed_size):
+                    self.assertEqual(self.xmp(heif).properties('xmp:CreatorTool', 'dc:title', 'dc:subject'), {
+                        'xmp:CreatorTool': 'shortcuts',
+                        'dc:title': 'Holiday',
+                        'dc:subject': None,
+                    })
+
+    def test_directory(self):
+        with HeifFile(self.motion_photo()) as heif:
+            self.assertEqual(self.xmp(heif).directory(), [
+                {'Item:Mime': 'image/heic', 'Item:Semantic': 'Primary',
+                 'Item:Length': '0', 'Item:Padding': '0'},
+                {'Item:Mime': 'video/quicktime', 'Item:Semantic': 'MotionPhoto',
+                 'Item:Length': str(len(mov())), 'Item:Padding': '0'},
+            ])
+
+    def test_packet_without_directory(self):
+        src = self.write('src.heic', heic((100, 50)))
+        dest = self.tmp + '/dest.heic'
+        inject_xmp(src, dest, XMP)
+        with HeifFile(dest) as heif:
+            chunk = self.xmp(heif)
+            self.assertEqual(chunk.directory(), [])
+            self.assertEqual(chunk.properties('GCamera:MotionPhoto'), {'GCamera:MotionPhoto': None})
+            self.assertEqual(chunk.raw(), XMP)
+
+    def test_describes_motion_photo(self):
+        out = io.StringIO()
+        with HeifFile(self.motion_photo()) as heif, contextlib.redirect_stdout(out):
+            heif.describe_for_motion_photo()
+        self.assertIn("'GCamera:MotionPhotoPresentationTimestampUs': '3000000'", out.getvalue())
+        self.assertIn('Container:Directory', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
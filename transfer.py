@@ -1,27 +1,148 @@
+"""
+Pushes files to the camera roll of an Android device over adb.
+
+Files are pushed in batches with a single multi-file `adb push`, and the
+media scanner is notified once per batch through a persistent `adb shell`
+session, instead of launching three adb processes per file.
+
+The adb binary can be overridden with the `ADB` environment variable, e.g.
+to point at a stand-in script for testing. It is looked up whenever a
+session is created, so it can be set after this module is imported.
+"""
 
 import os
+import shlex
 import subprocess
 import sys
+import uuid
 from tqdm import tqdm
 
+CAMERA_DIR = "/sdcard/DCIM/Camera"
+
+# Paths the media scanner is told about. The second one is the Pixel 2 XL
+# file location.
+SCAN_DIRS = ["/sdcard/DCIM/Camera", "/storage/emulated/0/DCIM/Camera"]
+
+
+def adb_binary() -> str:
+    return os.environ.get("ADB", "adb")
+
+
+class AdbShell(object):
+    """
+    A long-running `adb shell` session that commands are written to, so that
+    each command does not cost an adb process launch.
+    """
+
+    def __init__(self, adb=None):
+        self.adb = adb or adb_binary()
+        self.process = None
+        self._marker = "__done_%s__" % uuid.uuid4().hex
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [self.adb, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1)
+        return self
+
+    def __exit__(self, _1, _2, _3):
+        self.close()
+
+    def run(self, command: str):
+        """
+        Runs `command` on the device and returns its output lines and exit
+        status.
+        """
+        self.process.stdin.write("%s; echo %s $?\n" % (command, self._marker))
+        self.process.stdin.flush()
+
+        output = []
+        for line in self.process.stdout:
+            if line.startswith(self._marker):
+                return output, int(line.split()[-1])
+            output.append(line.rstrip("\n"))
+
+        raise Exception("adb shell exited unexpectedly")
+
+    def close(self):
+        if self.process:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class Device(object):
+    """
+    Queues files for the device's camera roll and pushes them `batch_size`
+    at a time. Callbacks passed to `push` run once their file is on the
+    device and has been handed to the media scanner.
+    """
+
+    def __init__(self, adb=None, batch_size=64, dest=CAMERA_DIR):
+        self.adb = adb or adb_binary()
+        self.batch_size = batch_size
+        self.dest = dest
+        self.shell = AdbShell(adb)
+        self.pending = []
+
+    def __enter__(self):
+        self.shell.__enter__()
+        return self
+
+    def __exit__(self, _1, _2, _3):
+        try:
+            if not _1:
+                self.flush()
+        finally:
+            self.shell.close()
+
+    def push(self, path: str, on_done=None):
+        self.pending.append((path, on_done))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        batch = self.pending
+        self.pending = []
+
+        subprocess.run([self.adb, "push"] + [path for (path, _) in batch] + [self.dest],
+                       stdout=subprocess.DEVNULL, check=True)
+        self.scan([os.path.basename(path) for (path, _) in batch])
+
+        for (_, on_done) in batch:
+            if on_done:
+                on_done()
+
+    def scan(self, file_names):
+        """
+        Tells the media scanner about the pushed files in one shell command.
+        """
+        uris = " ".join(shlex.quote("file://{}/{}".format(d, name))
+                        for name in file_names for d in SCAN_DIRS)
+        self.shell.run("for uri in {}; do am broadcast -a "
+                       "android.intent.action.MEDIA_SCANNER_SCAN_FILE "
+                       "-d \"$uri\" > /dev/null; done".format(uris))
+
+
 def transfer_file(folder, file_name):
-    fname = os.path.join(folder, file_name)
-    subprocess.run(["adb", "push", fname, "/sdcard/DCIM/Camera"])
-    subprocess.run(["adb", "shell", "am", "broadcast",
-                    "-a", "android.intent.action.MEDIA_SCANNER_SCAN_FILE",
-                    "-d", "file:///sdcard/DCIM/Camera/{}".format(file_name)])
-    # Pixel 2 XL file location
-    subprocess.run(["adb", "shell", "am", "broadcast",
-                    "-a", "android.intent.action.MEDIA_SCANNER_SCAN_FILE",
-                    "-d", "file:///storage/emulated/0/DCIM/Camera/{}".format(file_name)])
+    with Device(batch_size=1) as device:
+        device.push(os.path.join(folder, file_name))
 
 def transfer_all(folder):
-    for file_name in tqdm(os.listdir(folder)):
-        if file_name == '.DS_Store':
-            continue
-        f = os.path.join(folder, file_name)
-        print(f)
-        transfer_file(folder, file_name)
+    with Device() as device:
+        for file_name in tqdm(os.listdir(folder)):
+            if file_name == '.DS_Store':
+                continue
+            f = os.path.join(folder, file_name)
+            print(f)
+            device.push(f)
 
 if __name__ == "__main__":
     transfer_all(sys.argv[1])